@@ -0,0 +1,117 @@
+from typing import Any
+import json
+
+from config import Constants, get_logger
+
+LOGGER = get_logger()
+
+ChunkKey = tuple[str, int]
+
+REFERENCE_FIELDS = ("file_path", "chunk_index", "start_char", "end_char")
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // Constants.CHARS_PER_TOKEN.value)
+
+
+def message_tokens(message: dict[str, Any]) -> int:
+    """Estimate a message's prompt cost from its content and any tool-call arguments."""
+    text = message.get("content") or ""
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        text += function.get("name", "") + function.get("arguments", "")
+    return estimate_tokens(text)
+
+
+def load_query_payload(message: dict[str, Any]) -> dict[str, Any] | None:
+    """Return the parsed payload of a `query` tool message, or None for any other message."""
+    if message.get("role") != "tool":
+        return None
+    try:
+        payload = json.loads(message.get("content") or "")
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("results"), list):
+        return None
+    return payload
+
+
+def chunk_key(result: dict[str, Any]) -> ChunkKey | None:
+    if "chunk_index" not in result:
+        return None
+    return result["file_path"], result["chunk_index"]
+
+
+def chunk_reference(result: dict[str, Any]) -> dict[str, Any]:
+    return {field: result[field] for field in REFERENCE_FIELDS if field in result}
+
+
+class ConversationBudget:
+    """Keep an ask conversation under a token budget.
+
+    Each chunk is sent to the model in full once; later results repeating it are
+    reduced to a reference. When the conversation grows past the budget, the
+    oldest tool outputs are shortened to references, and their chunks become
+    eligible to be sent in full again if a later query returns them.
+    """
+
+    def __init__(self, max_tokens: int) -> None:
+        self.max_tokens = max_tokens
+        self.shown: dict[ChunkKey, str] = {}
+
+    def record(self, tool_messages: list[dict[str, str]]) -> list[dict[str, str]]:
+        """Drop chunks from new tool messages that are already visible in full."""
+        for message in tool_messages:
+            payload = load_query_payload(message)
+            if payload is None:
+                continue
+            results = []
+            seen = []
+            for result in payload["results"]:
+                key = chunk_key(result)
+                if key is not None and key in self.shown:
+                    seen.append(chunk_reference(result))
+                    continue
+                if key is not None:
+                    self.shown[key] = message["tool_call_id"]
+                results.append(result)
+            if seen:
+                payload["results"] = results
+                payload["already_seen"] = seen
+                message["content"] = json.dumps(payload)
+        return tool_messages
+
+    def shorten(self, message: dict[str, Any], payload: dict[str, Any]) -> None:
+        for result in payload["results"]:
+            key = chunk_key(result)
+            if key is not None and self.shown.get(key) == message["tool_call_id"]:
+                del self.shown[key]
+        payload["results"] = [chunk_reference(result) for result in payload["results"]]
+        payload["compacted"] = True
+        message["content"] = json.dumps(payload)
+
+    def compact(self, messages: list[dict[str, Any]]) -> None:
+        """Shorten tool outputs, oldest first, until the conversation fits the budget.
+
+        Outputs of the latest tool turn are kept whole so the model can read them at least once.
+        """
+        total = sum(message_tokens(message) for message in messages)
+        if total <= self.max_tokens:
+            return
+        latest_turn = max(
+            (i for i, message in enumerate(messages) if message.get("tool_calls")),
+            default=len(messages)
+        )
+        shortened = 0
+        for message in messages[:latest_turn]:
+            payload = load_query_payload(message)
+            if payload is None or payload.get("compacted"):
+                continue
+            before = message_tokens(message)
+            self.shorten(message, payload)
+            shortened += 1
+            total -= before - message_tokens(message)
+            if total <= self.max_tokens:
+                break
+        if shortened:
+            LOGGER.info(f"Shortened {shortened} tool outputs; conversation is ~{total} tokens (budget {self.max_tokens}).")
@@ -1,22 +1,24 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 from openai import OpenAI
 
 from ai_utils import log_model_error
-from indexing import ensure_index
+from search_engine import get_search_engine
 from schemas import AskConfig
+from assistant_context import ConversationBudget
 from assistant_prompt import build_messages, build_system_prompt, build_tools
-from assistant_tools import get_tool_calls, run_tool_call
+from assistant_stream import collect_streamed_message
+from assistant_tools import get_tool_calls, run_tool_calls
 
 
 def index_ready(index_root: Path) -> bool:
-    return ensure_index(index_root).ntotal > 0
+    return get_search_engine(index_root).ntotal() > 0
 
 
 def build_assistant_state(config: AskConfig) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
     system_prompt = build_system_prompt()
-    tools = build_tools(config.limit)
+    tools = build_tools(config.limit, config.search_mode)
     messages = build_messages(system_prompt, config.question)
     return tools, messages
 
@@ -25,13 +27,15 @@ def call_model(
     client: OpenAI,
     ai_model: str,
     messages: list[dict[str, Any]],
-    tools: list[dict[str, Any]]
+    tools: list[dict[str, Any]],
+    stream: bool = False
 ) -> Any:
     return client.chat.completions.create(
         model=ai_model,
         messages=messages,
         tools=tools,
-        tool_choice="auto"
+        tool_choice="auto",
+        stream=stream
     )
 
 
@@ -39,10 +43,15 @@ def request_response(
     client: OpenAI,
     config: AskConfig,
     messages: list[dict[str, Any]],
-    tools: list[dict[str, Any]]
+    tools: list[dict[str, Any]],
+    on_text: Callable[[str], None] | None = None
 ) -> tuple[Any | None, str | None]:
+    """Return the assistant message of one turn, streaming its text to `on_text` when given."""
     try:
-        return call_model(client, config.ai_model, messages, tools), None
+        if on_text is None:
+            return call_model(client, config.ai_model, messages, tools).choices[0].message, None
+        chunks = call_model(client, config.ai_model, messages, tools, stream=True)
+        return collect_streamed_message(chunks, on_text), None
     except Exception as exc:
         error = f"Failed to generate answer: {exc}"
         log_model_error(client, str(exc))
@@ -57,18 +66,18 @@ def append_tool_calls(
     config: AskConfig,
     source_root: Path,
     index_root: Path,
-    max_retries: int
+    max_retries: int,
+    budget: ConversationBudget
 ) -> None:
     messages.append(assistant_message.model_dump(exclude_none=True))
-    for tool_call in tool_calls:
-        messages.append(run_tool_call(
-            tool_call=tool_call,
-            client=client,
-            config=config,
-            source_root=source_root,
-            index_root=index_root,
-            max_retries=max_retries
-        ))
+    messages.extend(budget.record(run_tool_calls(
+        tool_calls=tool_calls,
+        client=client,
+        config=config,
+        source_root=source_root,
+        index_root=index_root,
+        max_retries=max_retries
+    )))
 
 
 def run_assistant_loop(
@@ -76,19 +85,24 @@ def run_assistant_loop(
     config: AskConfig,
     source_root: Path,
     index_root: Path,
-    max_turns: int = 8
+    max_turns: int = 8,
+    on_text: Callable[[str], None] | None = None
 ) -> tuple[str | None, str | None]:
+    """Answer the question, streaming every turn's text to `on_text` if it is given."""
     if not index_ready(index_root):
         return None, "Index is empty. Run 'index' command first."
     tools, messages = build_assistant_state(config)
+    budget = ConversationBudget(config.context_tokens)
     for _ in range(max_turns):
-        response, error = request_response(client, config, messages, tools)
+        budget.compact(messages)
+        assistant_message, error = request_response(client, config, messages, tools, on_text)
         if error:
             return None, error
-        assistant_message = response.choices[0].message
         tool_calls = get_tool_calls(assistant_message)
         if not tool_calls:
             return assistant_message.content or "", None
+        if on_text is not None and assistant_message.content:
+            on_text("\n\n")
         append_tool_calls(
             messages=messages,
             assistant_message=assistant_message,
@@ -97,6 +111,7 @@ def run_assistant_loop(
             config=config,
             source_root=source_root,
             index_root=index_root,
-            max_retries=config.tool_max_retries
+            max_retries=config.tool_max_retries,
+            budget=budget
         )
     return None, "Failed to produce a final answer after tool calls."
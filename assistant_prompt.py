@@ -1,5 +1,7 @@
 from typing import Any
 
+from config import SearchMode
+
 
 THINK_TOOL: dict[str, Any] = {
     "type": "function",
@@ -32,7 +34,7 @@ def build_system_prompt() -> str:
     )
 
 
-def build_query_tool(limit: int) -> dict[str, Any]:
+def build_query_tool(limit: int, search_mode: SearchMode) -> dict[str, Any]:
     return {
         "type": "function",
         "function": {
@@ -54,6 +56,28 @@ def build_query_tool(limit: int) -> dict[str, Any]:
                         "type": "integer",
                         "description": "Extra characters to include before and after each match.",
                         "default": 160
+                    },
+                    "search_mode": {
+                        "type": "string",
+                        "enum": [mode.value for mode in SearchMode],
+                        "description": (
+                            "vector for meaning, lexical for exact identifiers or error strings, "
+                            "hybrid for both."
+                        ),
+                        "default": search_mode.value
+                    },
+                    "path_prefix": {
+                        "type": "string",
+                        "description": "Only search files under this path, e.g. 'src/api/'."
+                    },
+                    "glob": {
+                        "type": "string",
+                        "description": "Only search files matching this glob, e.g. '*/tests/*.py'."
+                    },
+                    "extensions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only search files with these extensions, e.g. ['.py', '.pyi']."
                     }
                 },
                 "required": ["query"]
@@ -62,8 +86,8 @@ def build_query_tool(limit: int) -> dict[str, Any]:
     }
 
 
-def build_tools(limit: int) -> list[dict[str, Any]]:
-    return [THINK_TOOL, build_query_tool(limit)]
+def build_tools(limit: int, search_mode: SearchMode) -> list[dict[str, Any]]:
+    return [THINK_TOOL, build_query_tool(limit, search_mode)]
 
 
 def build_messages(system_prompt: str, question: str) -> list[dict[str, str]]:
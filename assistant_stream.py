@@ -0,0 +1,64 @@
+from typing import Any, Callable, Iterable
+
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+
+def merge_tool_call_delta(
+    calls: list[dict[str, str]],
+    slots: dict[int, int],
+    delta: Any
+) -> None:
+    """Fold one streamed tool-call fragment into `calls`, keyed by the fragment's index.
+
+    A new id at an index that already holds a call starts a new call, for
+    servers that reuse index 0 for every call.
+    """
+    index = delta.index if delta.index is not None else len(slots)
+    position = slots.get(index)
+    if position is None or (delta.id and calls[position]["id"] and delta.id != calls[position]["id"]):
+        position = len(calls)
+        slots[index] = position
+        calls.append({"id": "", "name": "", "arguments": ""})
+    call = calls[position]
+    if delta.id:
+        call["id"] = delta.id
+    if delta.function is not None:
+        call["name"] += delta.function.name or ""
+        call["arguments"] += delta.function.arguments or ""
+
+
+def build_streamed_message(content: str, calls: list[dict[str, str]]) -> ChatCompletionMessage:
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id=call["id"] or f"call_{i}",
+            type="function",
+            function=Function(name=call["name"], arguments=call["arguments"])
+        )
+        for i, call in enumerate(calls)
+    ]
+    return ChatCompletionMessage(
+        role="assistant",
+        content=content or None,
+        tool_calls=tool_calls or None
+    )
+
+
+def collect_streamed_message(
+    chunks: Iterable[Any],
+    on_text: Callable[[str], None]
+) -> ChatCompletionMessage:
+    """Assemble a streamed completion into one message, passing content deltas to `on_text` as they arrive."""
+    content_parts: list[str] = []
+    calls: list[dict[str, str]] = []
+    slots: dict[int, int] = {}
+    for chunk in chunks:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+            on_text(delta.content)
+        for tool_call_delta in delta.tool_calls or []:
+            merge_tool_call_delta(calls, slots, tool_call_delta)
+    return build_streamed_message("".join(content_parts), calls)
@@ -1,13 +1,14 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import json
 from typing import Any
 
 from openai import OpenAI
 
 from ai_utils import log_model_error
-from config import get_logger
+from config import Constants, SearchMode, get_logger
 from searching import search_index
-from schemas import AskConfig
+from schemas import AskConfig, SearchFilter
 
 LOGGER = get_logger()
 
@@ -43,17 +44,56 @@ def format_tool_message(tool_call_id: str, content: str) -> dict[str, str]:
 
 def parse_json_arguments(arguments: str) -> dict[str, Any]:
     try:
-        return json.loads(arguments) if arguments else {}
+        parsed = json.loads(arguments) if arguments else {}
     except json.JSONDecodeError:
         LOGGER.error("Tool arguments are not valid JSON.")
         return {}
+    if not isinstance(parsed, dict):
+        LOGGER.error("Tool arguments are not a JSON object.")
+        return {}
+    return parsed
 
 
-def read_query_args(tool_args: dict[str, Any], default_limit: int) -> tuple[str, int, int]:
-    query_text = tool_args.get("query", "")
-    query_limit = int(tool_args.get("limit", default_limit))
-    context_chars = int(tool_args.get("context_chars", 160))
-    return query_text, query_limit, context_chars
+def read_int_arg(tool_args: dict[str, Any], name: str, default: int, minimum: int) -> int:
+    """Read an integer argument, falling back to `default` for anything the model got wrong."""
+    value = tool_args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        LOGGER.warning(f"Ignoring invalid tool argument {name}={value!r}.")
+        return default
+    return number if number >= minimum else default
+
+
+def read_query_args(
+    tool_args: dict[str, Any],
+    default_limit: int,
+    default_mode: SearchMode
+) -> tuple[str, int, int, SearchMode, SearchFilter]:
+    """Read the query tool's arguments; invalid ones fall back to defaults rather than fail the call."""
+    query_text = str(tool_args.get("query") or "")
+    query_limit = read_int_arg(tool_args, "limit", default_limit, 1)
+    context_chars = read_int_arg(tool_args, "context_chars", 160, 0)
+    mode = tool_args.get("search_mode")
+    search_mode = SearchMode(mode) if isinstance(mode, str) and mode in set(SearchMode) else default_mode
+    extensions = tool_args.get("extensions") or ()
+    if isinstance(extensions, str):
+        extensions = [extensions]
+    elif not isinstance(extensions, (list, tuple)):
+        extensions = ()
+    search_filter = SearchFilter(
+        path_prefix=str(tool_args.get("path_prefix") or ""),
+        glob=str(tool_args.get("glob") or ""),
+        extensions=tuple(str(ext) for ext in extensions)
+    )
+    return query_text, query_limit, context_chars, search_mode, search_filter
+
+
+def trim_tool_result(result: dict[str, Any]) -> dict[str, Any]:
+    """Keep the chunk's location and text; scores are not useful to the model."""
+    return {key: value for key, value in result.items() if key not in ("distance", "similarity", "score")}
 
 
 def build_query_payload(
@@ -76,7 +116,9 @@ def run_query_tool(
     source_root: Path,
     index_root: Path
 ) -> tuple[str, bool]:
-    query_text, query_limit, context_chars = read_query_args(tool_args, config.limit)
+    query_text, query_limit, context_chars, search_mode, search_filter = read_query_args(
+        tool_args, config.limit, config.search_mode
+    )
     results, error = search_index(
         query_str=query_text,
         source_root=source_root,
@@ -84,10 +126,17 @@ def run_query_tool(
         client=client,
         model=config.embed_model,
         limit=query_limit,
+        nprobe=config.nprobe,
+        ef_search=config.ef_search,
+        rerank=config.rerank,
+        disk_cache=config.disk_cache,
+        search_mode=search_mode,
+        search_filter=search_filter,
         include_content=True,
         context_chars=context_chars,
-        include_metadata=False
+        include_metadata=True
     )
+    results = [trim_tool_result(result) for result in results]
     log_query_result_count(query_text, len(results))
     payload = build_query_payload(query_text, results, context_chars)
     if error:
@@ -121,16 +170,20 @@ def should_retry_tool(failed: bool, attempt: int, max_retries: int) -> bool:
     return failed and attempt < max_retries
 
 
-def run_tool_call(
-    tool_call: Any,
+def tool_call_key(tool_name: str, tool_args: dict[str, Any]) -> tuple[str, str]:
+    """Identify calls with the same name and arguments, which produce the same output."""
+    return (tool_name, json.dumps(tool_args, sort_keys=True, default=str))
+
+
+def run_tool_with_retries(
+    tool_name: str,
+    tool_args: dict[str, Any],
     client: OpenAI,
     config: AskConfig,
     source_root: Path,
     index_root: Path,
     max_retries: int
-) -> dict[str, str]:
-    tool_args = parse_tool_arguments(tool_call)
-    tool_name = tool_call.function.name
+) -> str:
     attempt = 0
     while True:
         log_tool_call(tool_name, tool_args)
@@ -143,6 +196,44 @@ def run_tool_call(
             index_root=index_root
         )
         if not should_retry_tool(failed, attempt, max_retries):
-            return format_tool_message(tool_call.id, output)
+            return output
         attempt += 1
         LOGGER.warning(f"Retrying tool call {tool_name}, attempt {attempt + 1}/{max_retries + 1}")
+
+
+def run_tool_calls(
+    tool_calls: list[Any],
+    client: OpenAI,
+    config: AskConfig,
+    source_root: Path,
+    index_root: Path,
+    max_retries: int
+) -> list[dict[str, str]]:
+    """Run a turn's tool calls concurrently, once per distinct call, keeping the original order."""
+    keys = []
+    unique_calls: dict[tuple[str, str], tuple[str, dict[str, Any]]] = {}
+    for tool_call in tool_calls:
+        tool_name = tool_call.function.name
+        tool_args = parse_tool_arguments(tool_call)
+        key = tool_call_key(tool_name, tool_args)
+        keys.append(key)
+        unique_calls.setdefault(key, (tool_name, tool_args))
+    if len(unique_calls) < len(tool_calls):
+        LOGGER.info(f"Merged {len(tool_calls) - len(unique_calls)} duplicate tool calls.")
+    workers = min(len(unique_calls), Constants.TOOL_CONCURRENCY.value)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {
+            key: executor.submit(
+                run_tool_with_retries,
+                tool_name,
+                tool_args,
+                client,
+                config,
+                source_root,
+                index_root,
+                max_retries
+            )
+            for key, (tool_name, tool_args) in unique_calls.items()
+        }
+        outputs = {key: future.result() for key, future in futures.items()}
+    return [format_tool_message(tool_call.id, outputs[key]) for tool_call, key in zip(tool_calls, keys)]
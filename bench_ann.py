@@ -0,0 +1,133 @@
+"""Benchmark: recall@k, query latency and size of the search index types against exact search.
+
+Compressed codes (fp16, SQ8, PQ) are also measured with exact re-ranking of
+RERANK_FACTOR * k over-fetched candidates.
+
+Usage: python bench_ann.py [vector_count] [index_root]
+
+With an index_root the stored vectors of that index are used (a sample of
+them becomes the query set); otherwise clustered synthetic vectors are used.
+"""
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+from faiss import IndexFlatL2, IndexIDMap2, omp_set_num_threads, serialize_index
+
+from config import Constants, IndexType
+from index_ann import (
+    build_search_index,
+    build_search_parameters,
+    has_compressed_codes,
+    read_flat_vectors,
+    rerank_candidates,
+)
+from index_store import ensure_index
+
+K = 10
+QUERY_COUNT = 500
+RERANK_FACTOR = Constants.RERANK_FACTOR.value
+SEARCH_SETTINGS = {
+    IndexType.HNSW: [("efSearch", value) for value in (16, 32, 64, 128, 256)],
+    IndexType.IVF_FLAT: [("nprobe", value) for value in (1, 4, 16, 64)],
+    IndexType.IVF_PQ: [("nprobe", value) for value in (1, 4, 16, 64)],
+}
+STORAGE_FACTORIES = [
+    ("IDMap,SQfp16", ("-", 0)),
+    ("IDMap,SQ8", ("-", 0)),
+    (f"IDMap,PQ{Constants.PQ_M.value}", ("-", 0)),
+    (f"IDMap,HNSW{Constants.HNSW_M.value},SQ8", ("efSearch", Constants.EF_SEARCH.value)),
+]
+
+
+def synthetic_vectors(count: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    dimensions = Constants.DIMENSIONS.value
+    centers = rng.standard_normal((max(count // 500, 1), dimensions)).astype("float32")
+    labels = rng.integers(0, len(centers), count)
+    noise = rng.standard_normal((count, dimensions)).astype("float32") * 0.35
+    return centers[labels] + noise
+
+
+def load_vectors(count: int, index_root: Path | None) -> np.ndarray:
+    if index_root is None:
+        return synthetic_vectors(count + QUERY_COUNT)
+    vectors, _ = read_flat_vectors(ensure_index(index_root))
+    return vectors[:count + QUERY_COUNT]
+
+
+def factory_for(index_type: IndexType, count: int) -> str:
+    nlist = 4 * int(np.sqrt(count))
+    return {
+        IndexType.HNSW: f"IDMap,HNSW{Constants.HNSW_M.value},Flat",
+        IndexType.IVF_FLAT: f"IVF{nlist},Flat",
+        IndexType.IVF_PQ: f"IVF{nlist},PQ{Constants.PQ_M.value}",
+    }[index_type]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def search_one(index, query: np.ndarray, params=None, exact=None) -> np.ndarray:
+    if exact is None:
+        return index.search(query[None, :], K, params=params)[1]
+    candidates = index.search(query[None, :], K * RERANK_FACTOR, params=params)[1]
+    return rerank_candidates(exact, query[None, :], candidates, K)[1]
+
+
+def time_search(index, queries: np.ndarray, params=None, exact=None) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    indices = np.vstack([search_one(index, query, params, exact) for query in queries])
+    return indices, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def bytes_per_vector(index) -> float:
+    return len(serialize_index(index)) / index.ntotal
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    index_root = Path(sys.argv[2]) if len(sys.argv) > 2 else None
+    omp_set_num_threads(1)
+    vectors = load_vectors(count, index_root)
+    base, queries = vectors[:-QUERY_COUNT], vectors[-QUERY_COUNT:]
+    ids = np.arange(1, len(base) + 1, dtype="int64")
+    exact = IndexIDMap2(IndexFlatL2(Constants.DIMENSIONS.value))
+    exact.add_with_ids(base, ids)
+    truth, exact_ms = time_search(exact, queries)
+    print(f"{len(base)} vectors, {len(queries)} queries, recall@{K} vs exact")
+    print(
+        f"{'index':24} {'setting':14} {'rerank':>6} {'build s':>8} {'B/vector':>9} "
+        f"{'recall':>8} {'ms/query':>9}"
+    )
+    print(
+        f"{'flat (exact)':24} {'-':14} {'-':>6} {'-':>8} {bytes_per_vector(exact):>9.0f} "
+        f"{1.0:>8.3f} {exact_ms:>9.3f}"
+    )
+    builds = [
+        (factory_for(index_type, len(base)), settings)
+        for index_type, settings in SEARCH_SETTINGS.items()
+    ]
+    builds += [(factory, [setting]) for factory, setting in STORAGE_FACTORIES]
+    for factory, settings in builds:
+        start = time.perf_counter()
+        index = build_search_index(exact, factory)
+        build_seconds = time.perf_counter() - start
+        size = bytes_per_vector(index)
+        reranks = (0, RERANK_FACTOR) if has_compressed_codes(index) else (0,)
+        for name, value in settings:
+            params = build_search_parameters(index, nprobe=value, ef_search=value)
+            setting = f"{name}={value}" if value else name
+            for rerank in reranks:
+                found, ms = time_search(index, queries, params, exact if rerank else None)
+                print(
+                    f"{factory:24} {setting:14} {rerank:>6} {build_seconds:>8.1f} {size:>9.0f} "
+                    f"{recall_at_k(found, truth):>8.3f} {ms:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Micro-benchmark: chunk rows per second for per-row vs batched SQLite persistence.
+
+Usage: python bench_chunk_store.py [file_count] [chunks_per_file]
+"""
+from os import stat_result
+from pathlib import Path
+from sqlite3 import Connection, connect
+from tempfile import TemporaryDirectory
+from typing import Any
+import sys
+import time
+
+from chunking import build_chunk
+from config import MIGRATION, PRAGMAS, Constants
+from index_db import store_file_batch
+
+
+def make_chunked_files(
+    file_count: int,
+    chunks_per_file: int,
+    revision: int
+) -> list[tuple[list[dict[str, Any]], stat_result]]:
+    file_stat = stat_result((0o644, 0, 0, 1, 0, 0, chunks_per_file * 100, 0, revision, 0))
+    chunked_files = []
+    for file_number in range(file_count):
+        content = "".join(
+            f"chunk {file_number}:{i} revision {revision if i % 2 else 0}".ljust(100)
+            for i in range(chunks_per_file)
+        )
+        chunks = [
+            build_chunk(Path(f"src/file_{file_number}.py"), content, i, i * 100, (i + 1) * 100)
+            for i in range(chunks_per_file)
+        ]
+        chunked_files.append((chunks, file_stat))
+    return chunked_files
+
+
+def store_per_row(
+    connection: Connection,
+    chunked_files: list[tuple[list[dict[str, Any]], stat_result]]
+) -> None:
+    """The previous persistence path: one SELECT plus one UPDATE or INSERT per chunk."""
+    cursor = connection.cursor()
+    file_batch_size = Constants.FILE_BATCH_SIZE.value
+    for file_number, (chunks, file_stat) in enumerate(chunked_files, 1):
+        for chunk in chunks:
+            cursor.execute(
+                "SELECT id, indexed FROM chunks WHERE file_path = ? AND chunk_index = ?",
+                (str(chunk['file_path']), chunk['chunk_index'])
+            )
+            row = cursor.fetchone()
+            values = (
+                file_stat.st_size,
+                file_stat.st_mtime,
+                chunk['start_char'],
+                chunk['end_char'],
+                chunk['content_hash'],
+            )
+            if row:
+                cursor.execute("""
+                    UPDATE chunks
+                    SET file_size = ?, modified_time = ?, start_char = ?, end_char = ?,
+                        content_hash = ?, indexed = 0
+                    WHERE id = ?
+                """, (*values, row[0]))
+            else:
+                cursor.execute("""
+                    INSERT INTO chunks
+                    (file_size, modified_time, start_char, end_char, content_hash,
+                     file_path, chunk_index, indexed)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                """, (*values, str(chunk['file_path']), chunk['chunk_index']))
+        if file_number % file_batch_size == 0:
+            connection.commit()
+    connection.commit()
+
+
+def store_batched(
+    connection: Connection,
+    chunked_files: list[tuple[list[dict[str, Any]], stat_result]]
+) -> None:
+    file_batch_size = Constants.FILE_BATCH_SIZE.value
+    for i in range(0, len(chunked_files), file_batch_size):
+        store_file_batch(connection, chunked_files[i:i + file_batch_size])
+        connection.commit()
+
+
+def open_db(path: Path, tuned: bool) -> Connection:
+    connection = connect(path)
+    if tuned:
+        connection.executescript(PRAGMAS)
+    connection.executescript(MIGRATION)
+    return connection
+
+
+def time_passes(store, connection: Connection, file_count: int, chunks_per_file: int) -> list[float]:
+    rates = []
+    for revision in range(2):
+        chunked_files = make_chunked_files(file_count, chunks_per_file, revision)
+        start = time.perf_counter()
+        store(connection, chunked_files)
+        rates.append(file_count * chunks_per_file / (time.perf_counter() - start))
+    return rates
+
+
+def main() -> None:
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chunks_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with TemporaryDirectory() as tmp:
+        for name, store, tuned in (
+            ("per-row, default journal", store_per_row, False),
+            ("batched upsert, WAL", store_batched, True),
+        ):
+            connection = open_db(Path(tmp) / f"{name.split(',')[0]}.db", tuned)
+            insert_rate, update_rate = time_passes(store, connection, file_count, chunks_per_file)
+            connection.close()
+            print(f"{name:28} insert {insert_rate:>10,.0f} rows/s   re-store {update_rate:>10,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
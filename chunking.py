@@ -1,7 +1,13 @@
+from hashlib import sha256
 from pathlib import Path
 from typing import Any
+from zlib import crc32
 
-from config import Constants
+from config import ChunkMode, Constants
+
+
+def hash_chunk_content(text: str) -> str:
+    return sha256(text.encode('utf-8')).hexdigest()
 
 
 def build_chunk(
@@ -11,23 +17,55 @@ def build_chunk(
     start: int,
     end: int
 ) -> dict[str, Any]:
+    text = content[start:end]
     return {
         'file_path': file_path,
         'chunk_index': chunk_index,
-        'content': content[start:end],
+        'content': text,
+        'content_hash': hash_chunk_content(text),
         'start_char': start,
-        'end_char': end
+        'end_char': end,
+        'start_byte': None,
+        'end_byte': None
     }
 
 
+def add_byte_offsets(chunks: list[dict[str, Any]], content: str) -> list[dict[str, Any]]:
+    """Record each chunk's UTF-8 byte range, encoding the content once in offset order."""
+    offsets = sorted({offset for chunk in chunks for offset in (chunk['start_char'], chunk['end_char'])})
+    byte_offsets: dict[int, int] = {}
+    char_position = 0
+    byte_position = 0
+    for offset in offsets:
+        byte_position += len(content[char_position:offset].encode('utf-8'))
+        char_position = offset
+        byte_offsets[offset] = byte_position
+    for chunk in chunks:
+        chunk['start_byte'] = byte_offsets[chunk['start_char']]
+        chunk['end_byte'] = byte_offsets[chunk['end_char']]
+    return chunks
+
+
 def chunk_file(
     file_path: Path,
     content: str,
-    chunk_size: int | None = None
+    chunk_size: int | None = None,
+    chunk_mode: ChunkMode = ChunkMode.FIXED
 ) -> list[dict[str, Any]]:
-    """Split file content into overlapping chunks with metadata."""
+    """Split file content into chunks with metadata."""
     if chunk_size is None:
         chunk_size = Constants.CHUNK_SIZE.value
+    if chunk_mode == ChunkMode.CONTENT:
+        return chunk_file_by_content(file_path, content, chunk_size)
+    return chunk_file_fixed(file_path, content, chunk_size)
+
+
+def chunk_file_fixed(
+    file_path: Path,
+    content: str,
+    chunk_size: int
+) -> list[dict[str, Any]]:
+    """Split file content into fixed-size overlapping windows."""
     overlap = Constants.CHUNK_OVERLAP.value
 
     if len(content) <= chunk_size:
@@ -45,3 +83,66 @@ def chunk_file(
             break
 
     return chunks
+
+
+def is_anchor_line(line: str) -> bool:
+    """A hash-selected subset of non-blank lines may end a chunk."""
+    stripped = line.strip()
+    if not stripped:
+        return False
+    return crc32(stripped.encode('utf-8', errors='ignore')) & Constants.CHUNK_ANCHOR_MASK.value == 0
+
+
+def cut_oversized(start: int, end: int, last_break: int, max_size: int) -> list[int]:
+    """Cut [start, end) into pieces no longer than max_size, preferring the last line break."""
+    cuts = []
+    while end - start > max_size:
+        start = last_break if last_break > start else start + max_size
+        cuts.append(start)
+    return cuts
+
+
+def find_content_boundaries(content: str, min_size: int, max_size: int) -> list[int]:
+    """Return chunk end offsets anchored to line content rather than absolute position."""
+    boundaries: list[int] = []
+    start = 0
+    last_break = -1
+    line_start = 0
+    while line_start < len(content):
+        newline = content.find('\n', line_start)
+        line_end = len(content) if newline == -1 else newline + 1
+        cuts = cut_oversized(start, line_end, last_break, max_size)
+        if cuts:
+            boundaries.extend(cuts)
+            start = cuts[-1]
+            last_break = -1
+        if line_end - start >= min_size:
+            if is_anchor_line(content[line_start:line_end]):
+                boundaries.append(line_end)
+                start = line_end
+                last_break = -1
+            else:
+                last_break = line_end
+        line_start = line_end
+    if start < len(content):
+        boundaries.append(len(content))
+    return boundaries
+
+
+def chunk_file_by_content(
+    file_path: Path,
+    content: str,
+    chunk_size: int
+) -> list[dict[str, Any]]:
+    """Split file content at content-defined line anchors between chunk_size/2 and chunk_size.
+
+    Boundaries depend only on nearby lines, so an edit shifts at most the chunks around it.
+    """
+    if len(content) <= chunk_size:
+        return [build_chunk(file_path, content, 0, 0, len(content))]
+    chunks = []
+    start = 0
+    for chunk_index, end in enumerate(find_content_boundaries(content, chunk_size // 2, chunk_size)):
+        chunks.append(build_chunk(file_path, content, chunk_index, start, end))
+        start = end
+    return chunks
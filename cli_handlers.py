@@ -1,45 +1,28 @@
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 from openai import OpenAI
-from rich.console import Console
-from rich.markdown import Markdown
 
 from ai_utils import connect_client, log_model_error
 from assistant_loop import run_assistant_loop
-from config import get_logger
+from cli_output import log_query_results, print_answer, stream_answer
+from config import ChunkMode, IndexType, SearchMode, VectorStorage, get_logger
 from indexer import run_indexing
 from indexing import erase_index, is_excluded
+from query_batch import run_batch_queries
+from query_server import run_query_server
 from schemas import (
     AskConfig,
     QueryConfig,
     build_ask_config,
+    build_batch_query_config,
     build_index_config,
     build_query_config,
+    build_serve_config,
 )
 from searching import search_index
 
 LOGGER = get_logger()
-CONSOLE = Console()
-
-
-def log_query_results(results: list[dict[str, Any]]) -> None:
-    LOGGER.info(f"\nTop {len(results)} results:")
-    for i, result in enumerate(results, 1):
-        similarity_pct = result['similarity'] * 100
-        LOGGER.info(
-            f"{i}. {result['file_path']} "
-            f"(chunk {result['chunk_index']}, chars {result['start_char']}-{result['end_char']}) "
-            f"- {similarity_pct:.1f}% similar"
-        )
-
-
-def print_answer(question: str, answer: str) -> None:
-    CONSOLE.print("\n" + "=" * 80)
-    CONSOLE.print(f"[bold cyan]Question:[/bold cyan] {question}")
-    CONSOLE.print("=" * 80 + "\n")
-    CONSOLE.print(Markdown(answer))
-    CONSOLE.print("\n" + "=" * 80)
 
 
 def handle_index(
@@ -49,9 +32,19 @@ def handle_index(
     api_key: str,
     model: str,
     chunk_size: int,
+    chunk_mode: ChunkMode,
+    max_file_size: int,
     file_batch_size: int,
     embed_batch_size: int,
     embed_batch_delay: float,
+    embed_concurrency: int,
+    pipeline_depth: int,
+    read_workers: int,
+    index_type: IndexType | None,
+    storage: VectorStorage | None,
+    nlist: int | None,
+    hnsw_m: int | None,
+    pq_m: int | None,
     erase: bool
 ) -> None:
     if is_excluded(source_root):
@@ -61,7 +54,17 @@ def handle_index(
         file_batch_size=file_batch_size,
         embed_batch_size=embed_batch_size,
         embed_batch_delay=embed_batch_delay,
+        embed_concurrency=embed_concurrency,
+        pipeline_depth=pipeline_depth,
+        read_workers=read_workers,
+        index_type=index_type,
+        storage=storage,
+        nlist=nlist,
+        hnsw_m=hnsw_m,
+        pq_m=pq_m,
         chunk_size=chunk_size,
+        chunk_mode=chunk_mode,
+        max_file_size=max_file_size,
         api_base=api_base,
         api_key=api_key,
         model=model,
@@ -79,13 +82,29 @@ def build_query_context(
     api_base: str,
     api_key: str,
     model: str,
-    limit: int
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    path_prefix: str,
+    glob: str,
+    extensions: list[str]
 ) -> tuple[QueryConfig | None, OpenAI | None]:
     config = build_query_config(
         api_base=api_base,
         api_key=api_key,
         model=model,
         limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
+        path_prefix=path_prefix,
+        glob=glob,
+        extensions=extensions,
         query_str=query_str,
     )
     if not config:
@@ -107,6 +126,12 @@ def run_query_search(
         client=client,
         model=config.model,
         limit=config.limit,
+        nprobe=config.nprobe,
+        ef_search=config.ef_search,
+        rerank=config.rerank,
+        disk_cache=config.disk_cache,
+        search_mode=config.search_mode,
+        search_filter=config.search_filter,
         include_content=False,
         include_metadata=True
     )
@@ -118,9 +143,31 @@ def handle_query(
     api_base: str,
     api_key: str,
     model: str,
-    limit: int
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    path_prefix: str,
+    glob: str,
+    extensions: list[str]
 ) -> None:
-    config, client = build_query_context(query_str, api_base, api_key, model, limit)
+    config, client = build_query_context(
+        query_str,
+        api_base,
+        api_key,
+        model,
+        limit,
+        nprobe,
+        ef_search,
+        rerank,
+        disk_cache,
+        search_mode,
+        path_prefix,
+        glob,
+        extensions
+    )
     if not config or not client:
         return
     results, error = run_query_search(config, client, index_root)
@@ -131,6 +178,48 @@ def handle_query(
     log_query_results(results)
 
 
+def handle_batch_query(
+    input_path: str,
+    output_path: Path,
+    source_root: Path,
+    index_root: Path,
+    api_base: str,
+    api_key: str,
+    model: str,
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    path_prefix: str,
+    glob: str,
+    extensions: list[str],
+    batch_size: int,
+    include_content: bool
+) -> None:
+    config = build_batch_query_config(
+        api_base=api_base,
+        api_key=api_key,
+        model=model,
+        limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
+        path_prefix=path_prefix,
+        glob=glob,
+        extensions=extensions,
+        batch_size=batch_size,
+        include_content=include_content,
+    )
+    if not config:
+        return
+    client = connect_client(config.api_base, config.api_key)
+    run_batch_queries(input_path, output_path, source_root, index_root, client, config)
+
+
 def build_ask_context(
     question: str,
     api_base: str,
@@ -138,7 +227,14 @@ def build_ask_context(
     embed_model: str,
     ai_model: str,
     limit: int,
-    tool_max_retries: int
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    tool_max_retries: int,
+    context_tokens: int,
+    stream: bool
 ) -> tuple[AskConfig | None, OpenAI | None]:
     config = build_ask_config(
         api_base=api_base,
@@ -146,7 +242,14 @@ def build_ask_context(
         embed_model=embed_model,
         ai_model=ai_model,
         limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
         tool_max_retries=tool_max_retries,
+        context_tokens=context_tokens,
+        stream=stream,
         question=question,
     )
     if not config:
@@ -159,14 +262,16 @@ def execute_ask(
     client: OpenAI,
     config: AskConfig,
     source_root: Path,
-    index_root: Path
+    index_root: Path,
+    on_text: Callable[[str], None] | None = None
 ) -> tuple[str | None, str | None]:
     LOGGER.info(f"Generating answer using {config.ai_model}...")
     return run_assistant_loop(
         client=client,
         config=config,
         source_root=source_root,
-        index_root=index_root
+        index_root=index_root,
+        on_text=on_text
     )
 
 
@@ -179,7 +284,14 @@ def handle_ask(
     embed_model: str,
     ai_model: str,
     limit: int,
-    tool_max_retries: int
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    tool_max_retries: int,
+    context_tokens: int,
+    stream: bool
 ) -> None:
     config, client = build_ask_context(
         question,
@@ -188,12 +300,69 @@ def handle_ask(
         embed_model,
         ai_model,
         limit,
-        tool_max_retries
+        nprobe,
+        ef_search,
+        rerank,
+        disk_cache,
+        search_mode,
+        tool_max_retries,
+        context_tokens,
+        stream
     )
     if not config or not client:
         return
+    if config.stream:
+        with stream_answer(question) as on_text:
+            _, error = execute_ask(client, config, source_root, index_root, on_text)
+        if error:
+            LOGGER.error(error)
+        return
     answer, error = execute_ask(client, config, source_root, index_root)
     if error:
         LOGGER.error(error)
         return
     print_answer(question, answer)
+
+
+def handle_serve(
+    source_root: Path,
+    index_root: Path,
+    api_base: str,
+    api_key: str,
+    embed_model: str,
+    ai_model: str,
+    host: str,
+    port: int,
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    tool_max_retries: int,
+    context_tokens: int,
+    batch_window_ms: float,
+    max_batch: int
+) -> None:
+    config = build_serve_config(
+        api_base=api_base,
+        api_key=api_key,
+        embed_model=embed_model,
+        ai_model=ai_model,
+        host=host,
+        port=port,
+        limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
+        tool_max_retries=tool_max_retries,
+        context_tokens=context_tokens,
+        batch_window_ms=batch_window_ms,
+        max_batch=max_batch,
+    )
+    if not config:
+        return
+    client = connect_client(config.api_base, config.api_key)
+    run_query_server(source_root, index_root, config, client)
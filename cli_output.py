@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from rich.console import Console
+from rich.live import Live
+from rich.markdown import Markdown
+
+from config import get_logger
+
+LOGGER = get_logger()
+CONSOLE = Console()
+
+
+def log_query_results(results: list[dict[str, Any]]) -> None:
+    LOGGER.info(f"\nTop {len(results)} results:")
+    for i, result in enumerate(results, 1):
+        if 'similarity' in result:
+            relevance = f"{result['similarity'] * 100:.1f}% similar"
+        else:
+            relevance = f"score {result['score']:.4f}"
+        LOGGER.info(
+            f"{i}. {result['file_path']} "
+            f"(chunk {result['chunk_index']}, chars {result['start_char']}-{result['end_char']}) "
+            f"- {relevance}"
+        )
+
+
+def print_question(question: str) -> None:
+    CONSOLE.print("\n" + "=" * 80)
+    CONSOLE.print(f"[bold cyan]Question:[/bold cyan] {question}")
+    CONSOLE.print("=" * 80 + "\n")
+
+
+def print_answer(question: str, answer: str) -> None:
+    print_question(question)
+    CONSOLE.print(Markdown(answer))
+    CONSOLE.print("\n" + "=" * 80)
+
+
+@contextmanager
+def stream_answer(question: str) -> Iterator[Callable[[str], None]]:
+    """Render answer text as Markdown while it arrives; yields the callback that appends to it."""
+    parts: list[str] = []
+    print_question(question)
+    with Live(
+        get_renderable=lambda: Markdown("".join(parts)),
+        console=CONSOLE,
+        refresh_per_second=12,
+        vertical_overflow="visible"
+    ):
+        yield parts.append
+    CONSOLE.print("\n" + "=" * 80)
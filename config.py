@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, StrEnum
 from logging import getLogger, INFO, Logger
 from rich.logging import RichHandler
 import re
@@ -12,11 +12,35 @@ CREATE TABLE IF NOT EXISTS chunks (
     modified_time REAL NOT NULL,
     start_char INTEGER NOT NULL,
     end_char INTEGER NOT NULL,
+    start_byte INTEGER,
+    end_byte INTEGER,
+    content_hash TEXT,
     indexed INTEGER NOT NULL DEFAULT 0,
     UNIQUE(file_path, chunk_index)
 );
 CREATE INDEX IF NOT EXISTS idx_file_path ON chunks(file_path);
 CREATE INDEX IF NOT EXISTS idx_indexed ON chunks(indexed);
+CREATE TABLE IF NOT EXISTS index_meta (
+    key TEXT PRIMARY KEY,
+    value NOT NULL
+);
+CREATE TABLE IF NOT EXISTS skipped_files (
+    file_path TEXT PRIMARY KEY,
+    file_size INTEGER NOT NULL,
+    modified_time REAL NOT NULL,
+    reason TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content);
+CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+    DELETE FROM chunks_fts WHERE rowid = old.id;
+END;
+"""
+
+PRAGMAS = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -65536;
 """
 
 
@@ -25,11 +49,88 @@ class Constants(Enum):
     META = "metadata.db"
     DIMENSIONS = 256
     VECTORS = "index.faiss"
+    SEGMENTS = "segments"
+    MAX_SEGMENTS = 64
+    SEARCH_VECTORS = "search.faiss"
+    AUTO_HNSW_MIN_VECTORS = 50_000
+    AUTO_IVF_PQ_MIN_VECTORS = 2_000_000
+    IVF_TRAIN_PER_LIST = 64
+    IVF_MIN_PER_LIST = 39
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 80
+    SEARCH_REBUILD_DRIFT = 0.2
+    PQ_M = 32
+    NPROBE = 16
+    EF_SEARCH = 64
+    RERANK_FACTOR = 4
+    HYBRID_CANDIDATE_FACTOR = 4
+    RRF_K = 60
+    QUERY_CACHE = "query_cache.db"
+    QUERY_CACHE_DISK_ENTRIES = 10_000
+    QUERY_CACHE_PRUNE_INTERVAL = 256
+    QUERY_EMBEDDING_CACHE_SIZE = 1024
+    QUERY_RESULT_CACHE_SIZE = 256
+    QUERY_FILTER_CACHE_SIZE = 64
+    FILTER_EXACT_MAX_IDS = 8192
+    SERVE_HOST = "127.0.0.1"
+    SERVE_PORT = 8765
+    SERVE_BATCH_WINDOW_MS = 2.0
+    SERVE_MAX_BATCH = 64
+    SERVE_QUERY_TIMEOUT = 60
+    SERVE_ASK_TIMEOUT = 600
+    TOOL_CONCURRENCY = 8
+    ASK_CONTEXT_TOKENS = 12_000
+    CHARS_PER_TOKEN = 4
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     MODEL = "nomic-embed-text"
     FILE_BATCH_SIZE = 50
     EMBED_BATCH_SIZE = 100
+    EMBED_CONCURRENCY = 1
+    PIPELINE_DEPTH = 2
+    READ_WORKERS = 4
+    WALK_WORKERS = 8
+    MAX_FILE_SIZE = 1_048_576
+    SNIFF_BYTES = 8192
+    BINARY_CONTROL_RATIO = 0.3
+    GENERATED_HEADER_LINES = 5
+    MINIFIED_LINE_LENGTH = 1000
+    MINIFIED_WHITESPACE_RATIO = 0.08
+    SQL_BATCH_SIZE = 500
+    CHUNK_ANCHOR_MASK = 0x7
+    MAX_UTF8_CHAR_BYTES = 4
+
+
+class ChunkMode(StrEnum):
+    FIXED = "fixed"
+    CONTENT = "content"
+
+
+class IndexType(StrEnum):
+    AUTO = "auto"
+    FLAT = "flat"
+    HNSW = "hnsw"
+    IVF_FLAT = "ivf_flat"
+    IVF_PQ = "ivf_pq"
+
+
+class SearchMode(StrEnum):
+    VECTOR = "vector"
+    HYBRID = "hybrid"
+    LEXICAL = "lexical"
+
+
+class SkipReason(StrEnum):
+    TOO_LARGE = "too large"
+    BINARY = "binary"
+    GENERATED = "generated"
+
+
+class VectorStorage(StrEnum):
+    FLOAT32 = "float32"
+    FP16 = "fp16"
+    SQ8 = "sq8"
+    PQ = "pq"
 
 
 EXCLUDES = [
@@ -50,7 +151,12 @@ EXCLUDES = [
     r".*\.lock$",
     r".*-lock\..*$",
 ]
-EXCLUDE_PATTERNS = [re.compile(pattern) for pattern in EXCLUDES]
+EXCLUDE_PATTERN = re.compile("|".join(f"(?:{pattern})" for pattern in EXCLUDES))
+IGNORE_FILES = (".gitignore", ".ignore")
+GENERATED_MARKER = re.compile(
+    rb"@generated\b|^[ \t]*(?://|#|/?\*|--|;)[ \t]*(?:Code generated|Generated by)\b.*\bDO NOT EDIT",
+    re.MULTILINE
+)
 
 
 def get_logger() -> Logger:
@@ -1,6 +1,8 @@
+from contextlib import contextmanager
 from sqlite3 import Connection, connect
 from pathlib import Path
-from config import MIGRATION, Constants
+from typing import Any, Iterator
+from config import MIGRATION, PRAGMAS, Constants
 
 
 def ensure_indexed_column(conn: Connection) -> None:
@@ -13,6 +15,73 @@ def ensure_indexed_column(conn: Connection) -> None:
         conn.commit()
 
 
+def ensure_content_hash_column(conn: Connection) -> None:
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(chunks)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "content_hash" not in columns:
+        cursor.execute("ALTER TABLE chunks ADD COLUMN content_hash TEXT")
+        conn.commit()
+
+
+def ensure_byte_offset_columns(conn: Connection) -> None:
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(chunks)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "start_byte" not in columns:
+        cursor.execute("ALTER TABLE chunks ADD COLUMN start_byte INTEGER")
+        cursor.execute("ALTER TABLE chunks ADD COLUMN end_byte INTEGER")
+        conn.commit()
+
+
+def get_meta(conn: Connection, key: str) -> Any:
+    row = conn.execute("SELECT value FROM index_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(conn: Connection, key: str, value: Any) -> None:
+    conn.execute("""
+        INSERT INTO index_meta (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    """, (key, value))
+
+
+def delete_meta(conn: Connection, *keys: str) -> None:
+    conn.executemany("DELETE FROM index_meta WHERE key = ?", [(key,) for key in keys])
+
+
+def get_generation(conn: Connection) -> int:
+    """Return the last vector generation committed together with the metadata."""
+    return int(get_meta(conn, "generation") or 0)
+
+
+def commit_generation(conn: Connection, generation: int) -> None:
+    """Record `generation` and commit it in the same transaction as any pending chunk changes."""
+    set_meta(conn, "generation", generation)
+    conn.commit()
+
+
+@contextmanager
+def savepoint(conn: Connection, name: str = "batch") -> Iterator[None]:
+    """Undo only the writes made inside the block if it raises; the enclosing transaction stays open."""
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+def connect_read_only(index_root: Path) -> Connection:
+    """Open the metadata database read-only for query processes; `ensure_db` must have created it."""
+    meta_file = index_root / Constants.INDEX.value / Constants.META.value
+    return connect(f"{meta_file.resolve().as_uri()}?mode=ro", uri=True)
+
+
 def ensure_db(index_root: Path) -> Connection:
     """Create or connect to SQLite database and run migrations."""
     from indexing import ensure_root
@@ -23,6 +92,9 @@ def ensure_db(index_root: Path) -> Connection:
         meta_file.touch()
 
     conn = connect(meta_file)
+    conn.executescript(PRAGMAS)
     conn.executescript(MIGRATION)
     ensure_indexed_column(conn)
+    ensure_content_hash_column(conn)
+    ensure_byte_offset_columns(conn)
     return conn
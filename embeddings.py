@@ -1,18 +1,62 @@
-from openai import OpenAI
+import base64
+
+import numpy as np
+from openai import BadRequestError, OpenAI
 from openai.types import CreateEmbeddingResponse
 
 from config import Constants
 
+FLOAT_ONLY_BACKENDS: set[str] = set()
 
-def generate_embeddings_batch(
+
+def request_embeddings(
     client: OpenAI,
     texts: list[str],
     model: str
-) -> list[list[float]]:
-    """Generate embeddings for a batch of texts."""
-    response: CreateEmbeddingResponse = client.embeddings.create(
+) -> CreateEmbeddingResponse:
+    """Ask for base64 embeddings, falling back to JSON floats for backends that reject the format."""
+    backend = str(client.base_url)
+    if backend not in FLOAT_ONLY_BACKENDS:
+        try:
+            return client.embeddings.create(
+                input=texts,
+                model=model,
+                dimensions=Constants.DIMENSIONS.value,
+                encoding_format="base64"
+            )
+        except BadRequestError:
+            pass
+    response = client.embeddings.create(
         input=texts,
         model=model,
-        dimensions=Constants.DIMENSIONS.value
+        dimensions=Constants.DIMENSIONS.value,
+        encoding_format="float"
     )
-    return [embedding.embedding for embedding in response.data]
+    FLOAT_ONLY_BACKENDS.add(backend)
+    return response
+
+
+def decode_embedding(embedding: str | list[float]) -> np.ndarray:
+    """Decode a base64 little-endian float32 embedding; backends that ignore the format send floats."""
+    if isinstance(embedding, str):
+        return np.frombuffer(base64.b64decode(embedding), dtype='<f4')
+    return np.asarray(embedding, dtype='float32')
+
+
+def generate_embeddings_batch(
+    client: OpenAI,
+    texts: list[str],
+    model: str,
+    out: np.ndarray | None = None
+) -> np.ndarray:
+    """Generate embeddings for a batch of texts as a float32 matrix with a row per text.
+
+    `out` lets callers decode straight into their slice of a larger matrix.
+    """
+    response = request_embeddings(client, texts, model)
+    if len(response.data) != len(texts):
+        raise ValueError(f"Expected {len(texts)} embeddings, got {len(response.data)}")
+    vectors = np.empty((len(texts), Constants.DIMENSIONS.value), dtype='float32') if out is None else out
+    for row, item in enumerate(response.data):
+        vectors[row] = decode_embedding(item.embedding)
+    return vectors
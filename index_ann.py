@@ -0,0 +1,383 @@
+from math import isqrt
+from pathlib import Path
+import re
+from sqlite3 import Connection
+import os
+import time
+
+import numpy as np
+from faiss import (
+    IO_FLAG_MMAP,
+    IO_FLAG_MMAP_IFC,
+    IDSelector,
+    IDSelectorBitmap,
+    IDSelectorRange,
+    Index,
+    IndexHNSW,
+    IndexIVF,
+    IndexIVFPQ,
+    IndexIVFScalarQuantizer,
+    IndexPQ,
+    IndexScalarQuantizer,
+    SearchParameters,
+    SearchParametersHNSW,
+    SearchParametersIVF,
+    copy_array_to_vector,
+    downcast_index,
+    index_factory,
+    knn,
+    read_index,
+    vector_to_array,
+    write_index,
+)
+
+from config import Constants, IndexType, VectorStorage, get_logger
+from database import delete_meta, get_generation, get_meta, set_meta
+from index_segments import list_segments, read_segment_ids, segment_generation
+from index_store import ensure_root, load_query_index, read_index_mapped
+from schemas import IndexConfig
+
+LOGGER = get_logger()
+
+ANN_SETTINGS = {
+    "index_type": IndexType.AUTO,
+    "storage": VectorStorage.FLOAT32,
+    "nlist": 0,
+    "hnsw_m": Constants.HNSW_M.value,
+    "pq_m": Constants.PQ_M.value,
+}
+LIVE_IDS = IDSelectorRange(0, np.iinfo("int64").max)
+
+
+def resolve_ann_settings(meta_db: Connection, config: IndexConfig) -> IndexConfig:
+    """Fill search index options left unset from the ones the index was last built with.
+
+    The resolved options are saved back, so a plain `index` run keeps the search index it has.
+    """
+    settings = {}
+    for name, default in ANN_SETTINGS.items():
+        value = getattr(config, name)
+        if value is None:
+            stored = get_meta(meta_db, name)
+            value = default if stored is None else type(default)(stored)
+        set_meta(meta_db, name, value)
+        settings[name] = value
+    return config.model_copy(update=settings)
+
+
+def resolve_index_type(index_type: IndexType, ntotal: int) -> IndexType:
+    """Pick a concrete index type, choosing by corpus size for `auto`."""
+    if index_type != IndexType.AUTO:
+        return index_type
+    if ntotal < Constants.AUTO_HNSW_MIN_VECTORS.value:
+        return IndexType.FLAT
+    if ntotal < Constants.AUTO_IVF_PQ_MIN_VECTORS.value:
+        return IndexType.HNSW
+    return IndexType.IVF_PQ
+
+
+def resolve_nlist(nlist: int, ntotal: int) -> int:
+    if nlist <= 0:
+        nlist = 4 * isqrt(ntotal)
+    return max(1, min(nlist, ntotal // Constants.IVF_MIN_PER_LIST.value))
+
+
+def resolve_storage_code(storage: VectorStorage, pq_m: int, ntotal: int) -> str:
+    """Return the FAISS code suffix for stored vectors: Flat, SQfp16, SQ8 or PQ."""
+    if storage == VectorStorage.FP16:
+        return "SQfp16"
+    if storage == VectorStorage.SQ8:
+        return "SQ8"
+    if storage == VectorStorage.PQ:
+        pq_train_size = (1 << 8) * Constants.IVF_MIN_PER_LIST.value
+        if ntotal >= pq_train_size:
+            return f"PQ{pq_m}"
+        LOGGER.warning(f"PQ storage needs at least {pq_train_size} vectors to train; using SQ8.")
+        return "SQ8"
+    return "Flat"
+
+
+def build_factory_string(config: IndexConfig, ntotal: int) -> str | None:
+    """Return the FAISS factory string for the search index, or None to search the flat store."""
+    index_type = resolve_index_type(config.index_type, ntotal)
+    if ntotal == 0:
+        return None
+    code = resolve_storage_code(config.storage, config.pq_m, ntotal)
+    if index_type == IndexType.FLAT:
+        return None if code == "Flat" else f"IDMap,{code}"
+    if index_type == IndexType.HNSW:
+        return f"IDMap,HNSW{config.hnsw_m},{code}"
+    nlist = resolve_nlist(config.nlist, ntotal)
+    pq_train_size = (1 << 8) * Constants.IVF_MIN_PER_LIST.value
+    if index_type == IndexType.IVF_PQ and ntotal >= pq_train_size:
+        return f"IVF{nlist},PQ{config.pq_m}"
+    if index_type == IndexType.IVF_PQ:
+        LOGGER.warning(f"IVF-PQ needs at least {pq_train_size} vectors to train; using IVF-{code}.")
+    return f"IVF{nlist},{code}"
+
+
+def is_same_layout(built: str | None, factory: str, config: IndexConfig) -> bool:
+    """Whether an index built from `built` still serves `factory`.
+
+    An automatic nlist follows the corpus size, so it alone does not force a rebuild.
+    """
+    if built == factory:
+        return True
+    if built is None or config.nlist:
+        return False
+    return re.sub(r"^IVF\d+", "IVF", built) == re.sub(r"^IVF\d+", "IVF", factory)
+
+
+def read_flat_vectors(faiss_index: Index) -> tuple[np.ndarray, np.ndarray]:
+    """Return (vectors, ids) stored in the flat ID-mapped index."""
+    vectors = faiss_index.index.reconstruct_n(0, faiss_index.ntotal)
+    ids = vector_to_array(faiss_index.id_map).astype("int64")
+    return vectors, ids
+
+
+def unwrap_index(faiss_index: Index) -> Index:
+    """Return the index under an ID map, downcast to its concrete type."""
+    if hasattr(faiss_index, "id_map"):
+        return downcast_index(faiss_index.index)
+    return downcast_index(faiss_index)
+
+
+def has_compressed_codes(faiss_index: Index) -> bool:
+    """Whether the index stores lossy codes, so its distances are approximate."""
+    inner = unwrap_index(faiss_index)
+    if isinstance(inner, IndexHNSW):
+        inner = downcast_index(inner.storage)
+    return isinstance(inner, (IndexScalarQuantizer, IndexPQ, IndexIVFScalarQuantizer, IndexIVFPQ))
+
+
+def sample_training_vectors(vectors: np.ndarray, nlist: int) -> np.ndarray:
+    count = max(nlist, 1 << 8) * Constants.IVF_TRAIN_PER_LIST.value
+    if len(vectors) <= count:
+        return vectors
+    rows = np.random.default_rng(0).choice(len(vectors), size=count, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_search_index(faiss_index: Index, factory: str) -> Index:
+    """Build an approximate index from the flat store, training quantizers on a sample."""
+    vectors, ids = read_flat_vectors(faiss_index)
+    index = index_factory(Constants.DIMENSIONS.value, factory)
+    inner = unwrap_index(index)
+    if isinstance(inner, IndexHNSW):
+        inner.hnsw.efConstruction = Constants.HNSW_EF_CONSTRUCTION.value
+    if not index.is_trained:
+        nlist = inner.nlist if isinstance(inner, IndexIVF) else 0
+        index.train(sample_training_vectors(vectors, nlist))
+    index.add_with_ids(vectors, ids)
+    return index
+
+
+def write_search_index(index: Index, search_file: Path) -> None:
+    temp_file = search_file.with_suffix(".tmp")
+    write_index(index, str(temp_file))
+    os.replace(temp_file, search_file)
+
+
+def remove_search_index(meta_db: Connection, search_file: Path) -> None:
+    search_file.unlink(missing_ok=True)
+    delete_meta(meta_db, "search_index", "search_generation", "search_drift")
+
+
+def remove_search_ids(index: Index, ids: np.ndarray) -> None:
+    """Remove ids from the search index.
+
+    HNSW graphs cannot drop nodes, so their ids are unmapped instead: the node still
+    routes searches, but LIVE_IDS keeps it out of the results until the next rebuild.
+    """
+    if not isinstance(unwrap_index(index), IndexHNSW):
+        index.remove_ids(ids)
+        return
+    id_map = vector_to_array(index.id_map)
+    id_map[np.isin(id_map, ids)] = -1
+    index.id_map.clear()
+    copy_array_to_vector(id_map, index.id_map)
+
+
+def count_live_vectors(faiss_index: Index) -> int:
+    """Count vectors a search can return, leaving out removed HNSW nodes."""
+    if hasattr(faiss_index, "id_map"):
+        return int(np.count_nonzero(vector_to_array(faiss_index.id_map) >= 0))
+    return faiss_index.ntotal
+
+
+def update_search_index(
+    meta_db: Connection,
+    faiss_index: Index,
+    index_dir: Path,
+    search_generation: int,
+    generation: int
+) -> bool:
+    """Apply the delta segments written since `search_generation` to the search index in place.
+
+    Returns False, leaving the index as it is, when one of those segments was already
+    compacted away or the changes since the last full build pass SEARCH_REBUILD_DRIFT.
+    """
+    segments = {segment_generation(segment_file): segment_file for segment_file in list_segments(index_dir)}
+    pending = range(search_generation + 1, generation + 1)
+    if any(segment not in segments for segment in pending):
+        return False
+    touched = np.unique(np.concatenate([
+        ids for segment in pending for ids in read_segment_ids(segments[segment])
+    ]))
+    drift = int(get_meta(meta_db, "search_drift") or 0) + len(touched)
+    if drift > Constants.SEARCH_REBUILD_DRIFT.value * faiss_index.ntotal:
+        return False
+    start_time = time.time()
+    search_file = index_dir / Constants.SEARCH_VECTORS.value
+    index = read_index(str(search_file))
+    remove_search_ids(index, touched)
+    live_ids = touched[np.isin(touched, vector_to_array(faiss_index.id_map))]
+    if len(live_ids):
+        index.add_with_ids(faiss_index.reconstruct_batch(live_ids), live_ids)
+    write_search_index(index, search_file)
+    set_meta(meta_db, "search_generation", generation)
+    set_meta(meta_db, "search_drift", drift)
+    meta_db.commit()
+    LOGGER.info(f"Updated the search index with {len(touched)} changed vectors in {time.time() - start_time:.1f}s.")
+    return True
+
+
+def refresh_search_index(
+    meta_db: Connection,
+    faiss_index: Index,
+    index_root: Path,
+    config: IndexConfig
+) -> None:
+    """Bring the search index up to the committed generation.
+
+    Changes are applied in place from the delta segments, so call this before
+    compact_index clears them; the index is rebuilt when its options changed or
+    the segments cannot bring it up to date.
+    """
+    index_dir = ensure_root(index_root)
+    search_file = index_dir / Constants.SEARCH_VECTORS.value
+    config = resolve_ann_settings(meta_db, config)
+    factory = build_factory_string(config, faiss_index.ntotal)
+    if factory is None:
+        remove_search_index(meta_db, search_file)
+        meta_db.commit()
+        return
+    generation = get_generation(meta_db)
+    search_generation = get_meta(meta_db, "search_generation")
+    if search_file.exists() and search_generation is not None and is_same_layout(
+        get_meta(meta_db, "search_index"), factory, config
+    ):
+        if search_generation == generation:
+            meta_db.commit()
+            return
+        if update_search_index(meta_db, faiss_index, index_dir, search_generation, generation):
+            return
+    start_time = time.time()
+    index = build_search_index(faiss_index, factory)
+    write_search_index(index, search_file)
+    set_meta(meta_db, "search_index", factory)
+    set_meta(meta_db, "search_generation", generation)
+    set_meta(meta_db, "search_drift", 0)
+    meta_db.commit()
+    LOGGER.info(f"Built {factory} search index over {index.ntotal} vectors in {time.time() - start_time:.1f}s.")
+
+
+def load_search_index(meta_db: Connection, index_root: Path) -> Index:
+    """Memory-map the approximate index if it matches the committed generation, else the flat store.
+
+    IVF inverted lists are mapped with IO_FLAG_MMAP; flat and HNSW storage with IO_FLAG_MMAP_IFC.
+    """
+    search_file = ensure_root(index_root) / Constants.SEARCH_VECTORS.value
+    if search_file.exists() and get_meta(meta_db, "search_generation") == get_generation(meta_db):
+        factory = str(get_meta(meta_db, "search_index") or "")
+        mmap_flag = IO_FLAG_MMAP if factory.startswith("IVF") else IO_FLAG_MMAP_IFC
+        index = read_index_mapped(search_file, mmap_flag)
+        if index is not None:
+            return index
+    return load_query_index(index_root)
+
+
+def build_search_parameters(
+    faiss_index: Index,
+    nprobe: int,
+    ef_search: int,
+    selector: IDSelector | None = None
+) -> SearchParameters | None:
+    """Build per-query search parameters; `selector` restricts the search to the ids it contains."""
+    inner = unwrap_index(faiss_index)
+    if isinstance(inner, IndexIVF):
+        return SearchParametersIVF(nprobe=nprobe, sel=selector)
+    if isinstance(inner, IndexHNSW):
+        if selector is None and hasattr(faiss_index, "id_map"):
+            selector = LIVE_IDS
+        return SearchParametersHNSW(efSearch=ef_search, sel=selector)
+    if selector is not None:
+        return SearchParameters(sel=selector)
+    return None
+
+
+def build_id_selector(ids: np.ndarray) -> IDSelector:
+    """Select ids with a bitmap over the id range; chunk ids are dense, so it stays small."""
+    flags = np.zeros(int(ids.max()) + 1, dtype=bool)
+    flags[ids] = True
+    return IDSelectorBitmap(np.packbits(flags, bitorder="little"))
+
+
+def search_id_subset(
+    exact_index: Index,
+    query_array: np.ndarray,
+    ids: np.ndarray,
+    limit: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Exact top-k over only the given ids, reconstructed from the float32 store.
+
+    For a small id set this is cheaper than any search over the whole index.
+    """
+    found_distances = np.full((len(query_array), limit), np.inf, dtype="float32")
+    found_indices = np.full((len(query_array), limit), -1, dtype="int64")
+    if not len(ids):
+        return found_distances, found_indices
+    k = min(limit, len(ids))
+    distances, positions = knn(query_array, exact_index.reconstruct_batch(ids), k)
+    found_distances[:, :k] = distances
+    found_indices[:, :k] = ids[positions]
+    return found_distances, found_indices
+
+
+def load_rerank_index(search_index: Index, index_root: Path, rerank: int) -> Index | None:
+    """Return the float32 store for exact re-ranking, or None if `search_index` is already exact.
+
+    Re-ranking is turned off when the store is missing or holds fewer vectors than the search index.
+    The store is memory-mapped, so it costs no memory until candidates are read from it, but
+    readahead pulls in more than the candidate rows: on a long-running server most of the
+    store ends up in the page cache.
+    """
+    if rerank <= 0 or not has_compressed_codes(search_index):
+        return None
+    store_index = load_query_index(index_root)
+    if store_index.ntotal < count_live_vectors(search_index):
+        LOGGER.warning(
+            f"The float32 store at {index_root} is missing or behind the search index; re-ranking is off."
+        )
+        return None
+    return store_index
+
+
+def rerank_candidates(
+    exact_index: Index,
+    query_array: np.ndarray,
+    indices: np.ndarray,
+    limit: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Re-order over-fetched candidates by exact L2 distance against the float32 store."""
+    candidates = indices[0][indices[0] != -1].astype("int64")
+    found_distances = np.full((1, limit), np.inf, dtype="float32")
+    found_indices = np.full((1, limit), -1, dtype="int64")
+    if not len(candidates):
+        return found_distances, found_indices
+    vectors = exact_index.reconstruct_batch(candidates)
+    exact = ((vectors - query_array[0]) ** 2).sum(axis=1)
+    order = np.argsort(exact, kind="stable")[:limit]
+    found_distances[0, :len(order)] = exact[order]
+    found_indices[0, :len(order)] = candidates[order]
+    return found_distances, found_indices
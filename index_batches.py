@@ -1,43 +1,120 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
 from sqlite3 import Connection
+from typing import Iterable, Iterator
 import time
 
+import numpy as np
 from faiss import Index
 from openai import OpenAI
 from tqdm import tqdm
 
 from ai_utils import log_model_error
-from config import get_logger
+from config import Constants, SkipReason, get_logger
 from embeddings import generate_embeddings_batch
-from index_db import process_file_batch
-from index_store import save_index
-from index_vectors import add_vectors, mark_chunks_indexed, remove_vectors
+from index_db import SkippedFile, chunk_file_batch, store_file_batch
+from index_vectors import commit_vector_additions, commit_vector_removals
 from schemas import IndexConfig
 
 LOGGER = get_logger()
 
+EmbedBatch = tuple[list[str], list[int], np.ndarray]
+
+
+def embed_text_batch(
+    client: OpenAI,
+    texts: list[str],
+    model: str,
+    delay: float,
+    out: np.ndarray | None = None
+) -> np.ndarray | None:
+    try:
+        vectors = generate_embeddings_batch(client, texts, model, out)
+    except Exception as exc:
+        LOGGER.error(f"Failed to generate embeddings: {exc}")
+        log_model_error(client, str(exc))
+        return None
+    if delay > 0:
+        time.sleep(delay)
+    return vectors
+
+
+def split_text_batches(
+    texts: list[str],
+    vector_ids: list[int],
+    vectors: np.ndarray,
+    batch_size: int
+) -> list[EmbedBatch]:
+    """Pair each request's texts and ids with the rows of `vectors` its embeddings are decoded into."""
+    return [
+        (texts[i:i + batch_size], vector_ids[i:i + batch_size], vectors[i:i + batch_size])
+        for i in range(0, len(texts), batch_size)
+    ]
+
+
+def run_sequential_batches(
+    client: OpenAI,
+    batches: list[EmbedBatch],
+    model: str,
+    delay: float,
+    pbar: tqdm
+) -> list[np.ndarray | None]:
+    results = []
+    for text_batch, _, out in batches:
+        results.append(embed_text_batch(client, text_batch, model, delay, out))
+        pbar.update(len(text_batch))
+    return results
+
+
+def run_concurrent_batches(
+    client: OpenAI,
+    batches: list[EmbedBatch],
+    model: str,
+    delay: float,
+    concurrency: int,
+    pbar: tqdm
+) -> list[np.ndarray | None]:
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(embed_text_batch, client, text_batch, model, delay, out)
+            for text_batch, _, out in batches
+        ]
+        sizes = {future: len(batch[0]) for future, batch in zip(futures, batches)}
+        for future in as_completed(futures):
+            pbar.update(sizes[future])
+        return [future.result() for future in futures]
+
 
 def embed_text_batches(
     client: OpenAI,
     texts: list[str],
+    vector_ids: list[int],
     model: str,
     batch_size: int,
-    delay: float
-) -> list[list[float]]:
-    vectors = []
+    delay: float,
+    concurrency: int = 1
+) -> tuple[np.ndarray, list[int]]:
+    """Embed texts in order with up to `concurrency` requests in flight; failed batches are dropped.
+
+    Every request decodes into its rows of one preallocated float32 matrix.
+    """
+    vectors = np.empty((len(texts), Constants.DIMENSIONS.value), dtype='float32')
+    batches = split_text_batches(texts, vector_ids, vectors, batch_size)
     with tqdm(total=len(texts), desc="  Embedding batch", unit="chunk", leave=False) as pbar:
-        for i in range(0, len(texts), batch_size):
-            text_batch = texts[i:i + batch_size]
-            try:
-                vectors.extend(generate_embeddings_batch(client, text_batch, model))
-                pbar.update(len(text_batch))
-                if delay > 0:
-                    time.sleep(delay)
-            except Exception as exc:
-                LOGGER.error(f"Failed to generate embeddings: {exc}")
-                log_model_error(client, str(exc))
-                pbar.update(len(text_batch))
-    return vectors
+        if concurrency > 1 and len(batches) > 1:
+            results = run_concurrent_batches(client, batches, model, delay, concurrency, pbar)
+        else:
+            results = run_sequential_batches(client, batches, model, delay, pbar)
+    if all(result is not None for result in results):
+        return vectors, vector_ids
+    kept = np.repeat(
+        [result is not None for result in results],
+        [len(id_batch) for _, id_batch, _ in batches]
+    )
+    embedded_ids = [vector_id for vector_id, keep in zip(vector_ids, kept) if keep]
+    return vectors[kept], embedded_ids
 
 
 def split_embed_queue(
@@ -48,17 +125,6 @@ def split_embed_queue(
     return texts, ids
 
 
-def apply_vector_removals(
-    faiss_index: Index,
-    remove_ids: list[int],
-    index_root: Path,
-    embed_queue: list[tuple[str, int]]
-) -> None:
-    remove_vectors(faiss_index, remove_ids)
-    if not embed_queue and remove_ids:
-        save_index(faiss_index, index_root)
-
-
 def handle_file_batch(
     meta_db: Connection,
     faiss_index: Index,
@@ -66,44 +132,60 @@ def handle_file_batch(
     file_batch: list[Path],
     source_root: Path,
     index_root: Path,
-    config: IndexConfig
+    config: IndexConfig,
+    skipped: Counter[SkipReason]
 ) -> int:
-    embed_queue, remove_ids = process_file_batch(
-        meta_db,
-        file_batch,
-        source_root,
-        config.chunk_size
+    chunked_files, skipped_files = chunk_file_batch(
+        file_batch, source_root, config.chunk_size, config.chunk_mode, config.max_file_size
     )
-    if not embed_queue and not remove_ids: return 0
-    apply_vector_removals(faiss_index, remove_ids, index_root, embed_queue)
+    count_skipped_files(skipped, skipped_files)
+    embed_queue, remove_ids = store_file_batch(meta_db, chunked_files, skipped_files)
+    commit_vector_removals(meta_db, faiss_index, remove_ids, index_root)
     if not embed_queue:
         return 0
     texts, vector_ids = split_embed_queue(embed_queue)
-    vectors = embed_text_batches(
+    vectors, vector_ids = embed_text_batches(
         client=client,
         texts=texts,
+        vector_ids=vector_ids,
         model=config.model,
         batch_size=config.embed_batch_size,
-        delay=config.embed_batch_delay
+        delay=config.embed_batch_delay,
+        concurrency=config.embed_concurrency
     )
-    added = add_vectors(faiss_index, vectors, vector_ids, index_root)
-    mark_chunks_indexed(meta_db, vector_ids)
-    return added
+    return commit_vector_additions(meta_db, faiss_index, vectors, vector_ids, index_root)
+
+
+def count_skipped_files(skipped: Counter[SkipReason], skipped_files: list[SkippedFile]) -> None:
+    skipped.update(reason for _, _, reason in skipped_files)
+
+
+def log_skipped_files(skipped: Counter[SkipReason]) -> None:
+    if skipped:
+        reasons = ", ".join(f"{count} {reason}" for reason, count in skipped.most_common())
+        LOGGER.info(f"Skipped {skipped.total()} files without indexing them: {reasons}.")
+
+
+def iter_path_batches(paths: Iterable[Path], batch_size: int) -> Iterator[list[Path]]:
+    """Group a (possibly lazy) stream of paths into lists of at most `batch_size`."""
+    iterator = iter(paths)
+    while file_batch := list(islice(iterator, batch_size)):
+        yield file_batch
 
 
 def run_index_batches(
     meta_db: Connection,
     faiss_index: Index,
     client: OpenAI,
-    paths: list[Path],
+    paths: Iterable[Path],
     source_root: Path,
     index_root: Path,
     config: IndexConfig
 ) -> int:
     total_chunks = 0
-    with tqdm(total=len(paths), desc="Processing files", unit="file") as pbar:
-        for i in range(0, len(paths), config.file_batch_size):
-            file_batch = paths[i:i + config.file_batch_size]
+    skipped: Counter[SkipReason] = Counter()
+    with tqdm(desc="Processing files", unit="file") as pbar:
+        for file_batch in iter_path_batches(paths, config.file_batch_size):
             total_chunks += handle_file_batch(
                 meta_db=meta_db,
                 faiss_index=faiss_index,
@@ -111,7 +193,9 @@ def run_index_batches(
                 file_batch=file_batch,
                 source_root=source_root,
                 index_root=index_root,
-                config=config
+                config=config,
+                skipped=skipped
             )
             pbar.update(len(file_batch))
+    log_skipped_files(skipped)
     return total_chunks
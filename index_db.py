@@ -3,158 +3,424 @@ from sqlite3 import Connection, Cursor
 from os import stat_result
 from typing import Any
 
-from config import get_logger
-from chunking import chunk_file
+from config import ChunkMode, Constants, SkipReason, get_logger
+from database import get_meta, savepoint, set_meta
+from chunking import add_byte_offsets, chunk_file
+from source_filters import read_source_bytes
 
 LOGGER = get_logger()
 
+ExistingChunk = tuple[int, int, str | None, int]
+PlannedChunk = tuple[dict[str, Any], stat_result, ExistingChunk | None]
+ChunkedFile = tuple[list[dict[str, Any]], stat_result]
+SkippedFile = tuple[str, stat_result, SkipReason]
 
-def process_file_batch(
-    connection: Connection,
+
+def chunk_file_batch(
     paths: list[Path],
     source_root: Path,
-    chunk_size: int | None = None
-) -> tuple[list[tuple[str, int]], list[int]]:
-    """Process a batch of files and return (prefixed_text, chunk_id) and ids to remove."""
-    cursor = connection.cursor()
-    embed_queue: list[tuple[str, int]] = []
-    remove_ids: list[int] = []
+    chunk_size: int | None = None,
+    chunk_mode: ChunkMode = ChunkMode.FIXED,
+    max_file_size: int = Constants.MAX_FILE_SIZE.value
+) -> tuple[list[ChunkedFile], list[SkippedFile]]:
+    """Read and chunk a batch of files without touching the database.
+
+    Files rejected as too large, binary or generated are returned separately with the reason.
+    """
+    chunked_files: list[ChunkedFile] = []
+    skipped_files: list[SkippedFile] = []
     for path in paths:
         try:
-            content, file_stat, relative_path = read_file_for_chunks(path, source_root)
-            chunks = chunk_file(relative_path, content, chunk_size)
-            new_queue, new_remove_ids = store_chunks(cursor, chunks, file_stat)
-            embed_queue.extend(new_queue)
-            remove_ids.extend(new_remove_ids)
+            raw, file_stat, skip_reason = read_source_bytes(path, max_file_size)
+            relative_path = path.relative_to(source_root)
+            if raw is None:
+                skipped_files.append((str(relative_path), file_stat, skip_reason))
+                continue
+            content = decode_source_bytes(raw)
+            chunks = chunk_file(relative_path, content, chunk_size, chunk_mode)
+            if len(content.encode('utf-8')) == len(raw):
+                add_byte_offsets(chunks, content)
+            chunked_files.append((chunks, file_stat))
         except Exception as e:
             LOGGER.warning(f"Failed to process {path}: {e}")
-            continue
-    connection.commit()
+    return chunked_files, skipped_files
+
+
+def store_file_batch(
+    connection: Connection,
+    chunked_files: list[ChunkedFile],
+    skipped_files: list[SkippedFile] | None = None
+) -> tuple[list[tuple[str, int]], list[int]]:
+    """Write a batch of chunked files with a handful of bulk statements; the caller commits.
+
+    Skipped files lose any chunks they had and are remembered so unchanged ones are not re-read.
+    If the batch fails it is retried file by file, so one bad file only loses its own rows.
+    """
+    skipped_files = skipped_files or []
+    try:
+        with savepoint(connection):
+            return write_file_batch(connection.cursor(), chunked_files, skipped_files)
+    except Exception as e:
+        if len(chunked_files) + len(skipped_files) <= 1:
+            LOGGER.warning(f"Failed to store chunks for {describe_batch(chunked_files, skipped_files)}: {e}")
+            return [], []
+        LOGGER.warning(f"Failed to store a batch of files, retrying one at a time: {e}")
+    embed_queue: list[tuple[str, int]] = []
+    remove_ids: list[int] = []
+    single_files = [([chunked_file], []) for chunked_file in chunked_files]
+    single_files.extend(([], [skipped_file]) for skipped_file in skipped_files)
+    for file_chunks, file_skip in single_files:
+        file_queue, file_remove_ids = store_file_batch(connection, file_chunks, file_skip)
+        embed_queue.extend(file_queue)
+        remove_ids.extend(file_remove_ids)
     return embed_queue, remove_ids
 
 
-def read_file_for_chunks(
-    path: Path,
-    source_root: Path
-) -> tuple[str, stat_result, Path]:
-    content = path.read_text(encoding='utf-8', errors='ignore')
-    file_stat = path.stat()
-    relative_path = path.relative_to(source_root)
-    return content, file_stat, relative_path
+def describe_batch(chunked_files: list[ChunkedFile], skipped_files: list[SkippedFile]) -> str:
+    file_paths = [str(chunks[0]['file_path']) for chunks, _ in chunked_files if chunks]
+    file_paths.extend(file_path for file_path, _, _ in skipped_files)
+    return ", ".join(file_paths) or "an empty file"
 
 
-def store_chunks(
+def write_file_batch(
     cursor: Cursor,
-    chunks: list[dict[str, Any]],
-    file_stat: stat_result
+    chunked_files: list[ChunkedFile],
+    skipped_files: list[SkippedFile]
 ) -> tuple[list[tuple[str, int]], list[int]]:
+    file_paths = [str(chunks[0]['file_path']) for chunks, _ in chunked_files if chunks]
+    skipped_paths = [file_path for file_path, _, _ in skipped_files]
+    existing = fetch_batch_chunks(cursor, file_paths + skipped_paths)
+    planned, unclaimed = plan_chunk_rows(chunked_files, existing)
+    unclaimed.extend(row for file_path in skipped_paths for row in existing.get(file_path, []))
+    write_skipped_rows(cursor, file_paths, skipped_files)
+    delete_chunk_rows(cursor, [row[0] for row in unclaimed])
+    move_chunk_rows(cursor, [item for item in planned if is_moved(item[0], item[2])])
+    upserted = upsert_chunk_rows(
+        cursor,
+        [item for item in planned if not is_moved(item[0], item[2])]
+    )
+    write_lexical_rows(cursor, planned, upserted)
+    remove_ids = [row[0] for row in unclaimed if row[3] == 1]
+    remove_ids.extend(
+        row[0]
+        for chunk, _, row in planned
+        if row and row[3] == 1 and not is_unchanged(chunk, row)
+    )
+    return build_embed_queue(planned, upserted), remove_ids
+
+
+def plan_chunk_rows(
+    chunked_files: list[ChunkedFile],
+    existing: dict[str, list[ExistingChunk]]
+) -> tuple[list[PlannedChunk], list[ExistingChunk]]:
+    """Pair every chunk with the existing row it reuses and collect rows nothing maps to."""
+    planned: list[PlannedChunk] = []
+    unclaimed: list[ExistingChunk] = []
+    for chunks, file_stat in chunked_files:
+        if not chunks:
+            continue
+        file_rows = existing.get(str(chunks[0]['file_path']), [])
+        assigned = assign_chunk_rows(chunks, file_rows)
+        claimed = {row[0] for row in assigned if row}
+        unclaimed.extend(row for row in file_rows if row[0] not in claimed)
+        planned.extend((chunk, file_stat, row) for chunk, row in zip(chunks, assigned))
+    return planned, unclaimed
+
+
+def planned_chunk_id(
+    chunk: dict[str, Any],
+    row: ExistingChunk | None,
+    upserted: dict[tuple[str, int], int]
+) -> int:
+    return row[0] if row else upserted[(str(chunk['file_path']), chunk['chunk_index'])]
+
+
+def build_embed_queue(
+    planned: list[PlannedChunk],
+    upserted: dict[tuple[str, int], int]
+) -> list[tuple[str, int]]:
     embed_queue: list[tuple[str, int]] = []
-    remove_ids: list[int] = []
-    for chunk in chunks:
-        chunk_id, was_indexed = upsert_chunk(cursor, chunk, file_stat)
-        if was_indexed:
-            remove_ids.append(chunk_id)
+    for chunk, _, row in planned:
+        if is_unchanged(chunk, row):
+            continue
         prefixed_text = f"search_document: {chunk['content']}"
-        embed_queue.append((prefixed_text, chunk_id))
-    return embed_queue, remove_ids
+        embed_queue.append((prefixed_text, planned_chunk_id(chunk, row, upserted)))
+    return embed_queue
 
 
-def upsert_chunk(
+def write_lexical_rows(
     cursor: Cursor,
-    chunk: dict[str, Any],
-    file_stat: stat_result
-) -> tuple[int, bool]:
-    row = fetch_existing_chunk(cursor, chunk)
-    if row:
-        return update_chunk(cursor, row, chunk, file_stat)
-    return insert_chunk(cursor, chunk, file_stat)
+    planned: list[PlannedChunk],
+    upserted: dict[tuple[str, int], int]
+) -> None:
+    """Index the text of every chunk of the batch for full-text search; deleted rows are dropped by a trigger."""
+    cursor.executemany(
+        "INSERT OR REPLACE INTO chunks_fts (rowid, content) VALUES (?, ?)",
+        [(planned_chunk_id(chunk, row, upserted), chunk['content']) for chunk, _, row in planned]
+    )
 
 
-def fetch_existing_chunk(cursor: Cursor, chunk: dict[str, Any]) -> tuple[int, int] | None:
-    cursor.execute("""
-        SELECT id, indexed FROM chunks
-        WHERE file_path = ? AND chunk_index = ?
-    """, (str(chunk['file_path']), chunk['chunk_index']))
-    row = cursor.fetchone()
-    if not row:
-        return None
-    return int(row[0]), int(row[1])
+def write_skipped_rows(cursor: Cursor, file_paths: list[str], skipped_files: list[SkippedFile]) -> None:
+    cursor.executemany("DELETE FROM skipped_files WHERE file_path = ?", [(file_path,) for file_path in file_paths])
+    cursor.executemany(
+        "INSERT OR REPLACE INTO skipped_files (file_path, file_size, modified_time, reason) VALUES (?, ?, ?, ?)",
+        [
+            (file_path, file_stat.st_size, file_stat.st_mtime, str(reason))
+            for file_path, file_stat, reason in skipped_files
+        ]
+    )
 
 
-def update_chunk(
-    cursor: Cursor,
-    row: tuple[int, int],
-    chunk: dict[str, Any],
-    file_stat: stat_result
-) -> tuple[int, bool]:
-    chunk_id, indexed = row
-    cursor.execute("""
-        UPDATE chunks
-        SET file_size = ?, modified_time = ?, start_char = ?, end_char = ?, indexed = 0
-        WHERE id = ?
-    """, (
-        file_stat.st_size,
-        file_stat.st_mtime,
-        chunk['start_char'],
-        chunk['end_char'],
-        chunk_id
-    ))
-    return chunk_id, indexed == 1
+def fetch_batch_chunks(cursor: Cursor, file_paths: list[str]) -> dict[str, list[ExistingChunk]]:
+    """Fetch the existing rows of every file in a batch, grouped by file path."""
+    existing: dict[str, list[ExistingChunk]] = {}
+    for i in range(0, len(file_paths), Constants.SQL_BATCH_SIZE.value):
+        path_batch = file_paths[i:i + Constants.SQL_BATCH_SIZE.value]
+        placeholders = ",".join("?" for _ in path_batch)
+        cursor.execute(f"""
+            SELECT file_path, id, chunk_index, content_hash, indexed FROM chunks
+            WHERE file_path IN ({placeholders})
+        """, path_batch)
+        for row in cursor.fetchall():
+            existing.setdefault(row[0], []).append(
+                (int(row[1]), int(row[2]), row[3], int(row[4]))
+            )
+    return existing
 
 
-def insert_chunk(
-    cursor: Cursor,
+def assign_chunk_rows(
+    chunks: list[dict[str, Any]],
+    existing: list[ExistingChunk]
+) -> list[ExistingChunk | None]:
+    """Pick an existing row for each chunk: same slot and hash, then same hash, then same slot."""
+    by_index = {row[1]: row for row in existing}
+    assigned: list[ExistingChunk | None] = [None] * len(chunks)
+    claimed: set[int] = set()
+    for i, chunk in enumerate(chunks):
+        row = by_index.get(chunk['chunk_index'])
+        if row and row[3] == 1 and row[2] == chunk['content_hash']:
+            assigned[i] = row
+            claimed.add(row[0])
+    by_hash: dict[str, list[ExistingChunk]] = {}
+    for row in existing:
+        if row[3] == 1 and row[0] not in claimed:
+            by_hash.setdefault(row[2], []).append(row)
+    for i, chunk in enumerate(chunks):
+        candidates = by_hash.get(chunk['content_hash'])
+        if assigned[i] is None and candidates:
+            assigned[i] = candidates.pop()
+            claimed.add(assigned[i][0])
+    for i, chunk in enumerate(chunks):
+        row = by_index.get(chunk['chunk_index'])
+        if assigned[i] is None and row and row[0] not in claimed:
+            assigned[i] = row
+            claimed.add(row[0])
+    return assigned
+
+
+def is_moved(chunk: dict[str, Any], row: ExistingChunk | None) -> bool:
+    return row is not None and row[1] != chunk['chunk_index']
+
+
+def is_unchanged(chunk: dict[str, Any], row: ExistingChunk | None) -> bool:
+    return row is not None and row[3] == 1 and row[2] == chunk['content_hash']
+
+
+def chunk_row_values(
     chunk: dict[str, Any],
-    file_stat: stat_result
-) -> tuple[int, bool]:
-    cursor.execute("""
-        INSERT INTO chunks
-        (file_path, chunk_index, file_size, modified_time, start_char, end_char, indexed)
-        VALUES (?, ?, ?, ?, ?, ?, 0)
-    """, (
+    file_stat: stat_result,
+    row: ExistingChunk | None
+) -> tuple[Any, ...]:
+    return (
         str(chunk['file_path']),
         chunk['chunk_index'],
         file_stat.st_size,
         file_stat.st_mtime,
         chunk['start_char'],
-        chunk['end_char']
-    ))
-    return int(cursor.lastrowid), False
+        chunk['end_char'],
+        chunk['start_byte'],
+        chunk['end_byte'],
+        chunk['content_hash'],
+        1 if is_unchanged(chunk, row) else 0,
+    )
+
+
+def delete_chunk_rows(cursor: Cursor, chunk_ids: list[int]) -> None:
+    cursor.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+
+
+def move_chunk_rows(
+    cursor: Cursor,
+    moved: list[PlannedChunk]
+) -> None:
+    """Rewrite reused rows that change slot, parking them first so (file_path, chunk_index) stays unique."""
+    cursor.executemany(
+        "UPDATE chunks SET chunk_index = ? WHERE id = ?",
+        [(-row[0], row[0]) for _, _, row in moved]
+    )
+    cursor.executemany("""
+        UPDATE chunks
+        SET file_path = ?, chunk_index = ?, file_size = ?, modified_time = ?,
+            start_char = ?, end_char = ?, start_byte = ?, end_byte = ?, content_hash = ?, indexed = ?
+        WHERE id = ?
+    """, [(*chunk_row_values(chunk, file_stat, row), row[0]) for chunk, file_stat, row in moved])
+
+
+def upsert_chunk_rows(
+    cursor: Cursor,
+    planned: list[PlannedChunk]
+) -> dict[tuple[str, int], int]:
+    """Upsert rows in multi-row statements and return their ids keyed by (file_path, chunk_index)."""
+    ids: dict[tuple[str, int], int] = {}
+    for i in range(0, len(planned), Constants.SQL_BATCH_SIZE.value):
+        row_batch = planned[i:i + Constants.SQL_BATCH_SIZE.value]
+        placeholders = ",".join("(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" for _ in row_batch)
+        values = [
+            value
+            for chunk, file_stat, row in row_batch
+            for value in chunk_row_values(chunk, file_stat, row)
+        ]
+        cursor.execute(f"""
+            INSERT INTO chunks
+            (file_path, chunk_index, file_size, modified_time, start_char, end_char,
+             start_byte, end_byte, content_hash, indexed)
+            VALUES {placeholders}
+            ON CONFLICT(file_path, chunk_index) DO UPDATE SET
+                file_size = excluded.file_size,
+                modified_time = excluded.modified_time,
+                start_char = excluded.start_char,
+                end_char = excluded.end_char,
+                start_byte = excluded.start_byte,
+                end_byte = excluded.end_byte,
+                content_hash = excluded.content_hash,
+                indexed = excluded.indexed
+            RETURNING id, file_path, chunk_index
+        """, values)
+        ids.update(((row[1], int(row[2])), int(row[0])) for row in cursor.fetchall())
+    return ids
 
 
-def read_chunk_content(file_path: Path, start_char: int, end_char: int) -> str:
-    """Read the content of a specific chunk from a file."""
+def decode_source_bytes(data: bytes) -> str:
+    """Decode like read_text(errors='ignore'), including universal newline translation."""
+    return data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_source_text(file_path: Path) -> str | None:
+    """Read a source file once so several chunks can be sliced from it."""
     try:
-        content = file_path.read_text(encoding='utf-8', errors='ignore')
-        return content[start_char:end_char]
+        return decode_source_bytes(file_path.read_bytes())
     except Exception as e:
-        LOGGER.warning(f"Failed to read chunk from {file_path}: {e}")
-        return ""
+        LOGGER.warning(f"Failed to read {file_path}: {e}")
+        return None
+
 
+def is_source_unchanged(file_path: Path, file_size: int, modified_time: float) -> bool:
+    """Whether the file still has the size and mtime it had when its chunks were recorded."""
+    try:
+        file_stat = file_path.stat()
+    except OSError:
+        return False
+    return file_stat.st_size == file_size and file_stat.st_mtime == modified_time
+
+
+def slice_chunk_context(content: str, start_char: int, end_char: int, context_chars: int) -> str:
+    start = max(0, start_char - context_chars)
+    end = min(len(content), end_char + context_chars)
+    return content[start:end]
 
-def read_chunk_with_context(
+
+def read_chunk_snippet(
     file_path: Path,
-    start_char: int,
-    end_char: int,
+    start_byte: int,
+    end_byte: int,
     context_chars: int
-) -> str:
+) -> tuple[str, str]:
+    """Seek to a chunk's byte range and return (content, context) without decoding the rest of the file."""
+    margin = context_chars * Constants.MAX_UTF8_CHAR_BYTES.value
+    read_start = max(0, start_byte - margin)
     try:
-        content = file_path.read_text(encoding='utf-8', errors='ignore')
-        start = max(0, start_char - context_chars)
-        end = min(len(content), end_char + context_chars)
-        return content[start:end]
+        with file_path.open('rb') as source:
+            source.seek(read_start)
+            data = source.read(end_byte + margin - read_start)
     except Exception as e:
-        LOGGER.warning(f"Failed to read context from {file_path}: {e}")
-        return ""
+        LOGGER.warning(f"Failed to read chunk from {file_path}: {e}")
+        return "", ""
+    content = decode_source_bytes(data[start_byte - read_start:end_byte - read_start])
+    if context_chars <= 0:
+        return content, content
+    before = decode_source_bytes(data[:start_byte - read_start])[-context_chars:]
+    after = decode_source_bytes(data[end_byte - read_start:])[:context_chars]
+    return content, before + content + after
 
 
-def get_indexed_files(connection: Connection) -> set[str]:
-    """Get set of file paths that are already indexed."""
+def get_file_states(
+    connection: Connection,
+    max_file_size: int = Constants.MAX_FILE_SIZE.value
+) -> dict[str, tuple[int, float, bool]]:
+    """Get (file_size, modified_time, up_to_date) for every file in the metadata, skipped files included.
+
+    A size verdict only holds for the current cap: indexed files above it and files
+    rejected as too large that now fit under it are reported as out of date.
+    """
     cursor = connection.cursor()
     cursor.execute("""
-        SELECT file_path
+        SELECT file_path, MAX(file_size), MAX(modified_time), MIN(indexed) = 1 AND MAX(file_size) <= ?
         FROM chunks
         GROUP BY file_path
-        HAVING MIN(indexed) = 1
-    """)
-    return {row[0] for row in cursor.fetchall()}
+        UNION ALL
+        SELECT file_path, file_size, modified_time, reason != ? OR file_size > ?
+        FROM skipped_files
+    """, (max_file_size, str(SkipReason.TOO_LARGE), max_file_size))
+    return {
+        row[0]: (int(row[1]), float(row[2]), row[3] == 1)
+        for row in cursor.fetchall()
+    }
+
+
+def delete_file_chunks(connection: Connection, file_paths: list[str]) -> list[int]:
+    """Delete all chunk and skip rows of the given files and return the ids that had vectors; the caller commits."""
+    cursor = connection.cursor()
+    removed_ids: list[int] = []
+    for i in range(0, len(file_paths), Constants.SQL_BATCH_SIZE.value):
+        path_batch = file_paths[i:i + Constants.SQL_BATCH_SIZE.value]
+        placeholders = ",".join("?" for _ in path_batch)
+        cursor.execute(
+            f"SELECT id FROM chunks WHERE indexed = 1 AND file_path IN ({placeholders})",
+            path_batch
+        )
+        removed_ids.extend(int(row[0]) for row in cursor.fetchall())
+        cursor.execute(f"DELETE FROM chunks WHERE file_path IN ({placeholders})", path_batch)
+        cursor.execute(f"DELETE FROM skipped_files WHERE file_path IN ({placeholders})", path_batch)
+    return removed_ids
+
+
+def backfill_lexical_index(connection: Connection, source_root: Path) -> None:
+    """Index the text of chunks stored before full-text search existed, reading each file once.
+
+    Files changed since they were chunked are skipped; re-indexing them writes their text.
+    """
+    if get_meta(connection, "lexical_index"):
+        return
+    rows = connection.execute("""
+        SELECT file_path, id, start_char, end_char, file_size, modified_time FROM chunks
+        WHERE id NOT IN (SELECT rowid FROM chunks_fts)
+        ORDER BY file_path
+    """).fetchall()
+    if rows:
+        LOGGER.info(f"Building the full-text index for {len(rows)} existing chunks...")
+    cursor = connection.cursor()
+    sources: dict[str, str | None] = {}
+    for file_path, chunk_id, start_char, end_char, file_size, modified_time in rows:
+        if file_path not in sources:
+            sources.clear()
+            full_path = source_root / file_path
+            unchanged = is_source_unchanged(full_path, file_size, modified_time)
+            sources[file_path] = read_source_text(full_path) if unchanged else None
+        source = sources[file_path]
+        if source is not None:
+            cursor.execute(
+                "INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)",
+                (chunk_id, source[start_char:end_char])
+            )
+    set_meta(connection, "lexical_index", 1)
+    connection.commit()
@@ -1,23 +1,181 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from os import walk
+from os import scandir, stat_result
+from typing import Iterator
+import re
 
-from config import EXCLUDE_PATTERNS
+from config import EXCLUDE_PATTERN, IGNORE_FILES, Constants, get_logger
+
+LOGGER = get_logger()
+
+IgnoreRule = tuple[re.Pattern[str], bool, bool]
+IgnoreScope = tuple[str, list[IgnoreRule]]
+SourceFile = tuple[str, str, stat_result | None]
+DirectoryTask = tuple[str, str, list[IgnoreScope]]
 
 
 def is_excluded(path: Path) -> bool:
     """Check if a name matches any of the exclude patterns."""
-    return any(pattern.match(path.name) for pattern in EXCLUDE_PATTERNS)
+    return is_excluded_name(path.name)
+
+
+def is_excluded_name(name: str) -> bool:
+    return EXCLUDE_PATTERN.match(name) is not None
+
+
+def translate_ignore_glob(pattern: str) -> str:
+    """Translate a gitignore glob into a regex body; `*` and `?` stop at `/`, `**` crosses directories."""
+    parts: list[str] = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body[0] == "!":
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+def parse_ignore_line(line: str) -> IgnoreRule | None:
+    """Parse one .gitignore line into (pattern, negated, directory_only)."""
+    line = line.rstrip("\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip()
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated or line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    body = translate_ignore_glob(line.lstrip("/"))
+    prefix = "" if anchored else "(?:.*/)?"
+    return re.compile(f"{prefix}{body}$"), negated, directory_only
+
+
+def read_ignore_rules(directory: str, names: set[str]) -> list[IgnoreRule]:
+    rules: list[IgnoreRule] = []
+    for ignore_file in IGNORE_FILES:
+        if ignore_file not in names:
+            continue
+        try:
+            with open(f"{directory}/{ignore_file}", encoding='utf-8', errors='ignore') as lines:
+                rules.extend(rule for rule in map(parse_ignore_line, lines) if rule is not None)
+        except OSError as e:
+            LOGGER.warning(f"Failed to read {directory}/{ignore_file}: {e}")
+    return rules
+
+
+def is_ignored(scopes: list[IgnoreScope], relative_path: str, is_dir: bool) -> bool:
+    """Apply ignore rules from the root down; the last matching rule wins, as in git."""
+    ignored = False
+    for base, rules in scopes:
+        scoped_path = relative_path[len(base):]
+        for pattern, negated, directory_only in rules:
+            if directory_only and not is_dir:
+                continue
+            if pattern.match(scoped_path):
+                ignored = not negated
+    return ignored
+
+
+def scan_directory(task: DirectoryTask) -> tuple[list[SourceFile], list[DirectoryTask], str | None]:
+    """List one directory, returning its kept files (with stat), the subdirectories to walk next,
+    and its relative path if it could not be listed.
+    """
+    directory, relative, scopes = task
+    try:
+        with scandir(directory) as listing:
+            entries = list(listing)
+    except OSError as e:
+        LOGGER.warning(f"Failed to list {directory}: {e}")
+        return [], [], relative
+    rules = read_ignore_rules(directory, {entry.name for entry in entries})
+    if rules:
+        scopes = [*scopes, (relative, rules)]
+    files: list[SourceFile] = []
+    subdirectories: list[DirectoryTask] = []
+    for entry in entries:
+        if is_excluded_name(entry.name):
+            continue
+        relative_path = relative + entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if scopes and is_ignored(scopes, relative_path, is_dir):
+            continue
+        if is_dir:
+            if not entry.is_symlink():
+                subdirectories.append((entry.path, relative_path + "/", scopes))
+            continue
+        try:
+            file_stat = entry.stat()
+        except OSError:
+            file_stat = None
+        files.append((entry.path, relative_path, file_stat))
+    return files, subdirectories, None
+
+
+def root_ignore_scopes(source_root: Path) -> list[IgnoreScope]:
+    """Rules from .git/info/exclude apply to the whole tree, beneath any .gitignore."""
+    exclude_file = source_root / ".git" / "info" / "exclude"
+    try:
+        lines = exclude_file.read_text(encoding='utf-8', errors='ignore').splitlines()
+    except OSError:
+        return []
+    rules = [rule for rule in map(parse_ignore_line, lines) if rule is not None]
+    return [("", rules)] if rules else []
+
+
+def iter_source_files(
+    source_root: Path,
+    workers: int = Constants.WALK_WORKERS.value,
+    unlisted: list[str] | None = None
+) -> Iterator[SourceFile]:
+    """Walk the tree with `workers` threads, yielding (path, relative_path, stat) as directories are listed.
+
+    Files come out in no particular order, and the walk only advances as the caller consumes them.
+    Relative paths of directories that could not be listed ("" for the root, else ending in "/")
+    are appended to `unlisted`.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk") as executor:
+        pending: set[Future] = {
+            executor.submit(scan_directory, (str(source_root), "", root_ignore_scopes(source_root)))
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirectories, failed = future.result()
+                if failed is not None and unlisted is not None:
+                    unlisted.append(failed)
+                pending.update(executor.submit(scan_directory, task) for task in subdirectories)
+                yield from files
 
 
 def collect_paths(source_root: Path) -> list[Path]:
-    """Recursively collect all non-excluded file paths."""
-    paths = []
-    for dirpath, dirnames, filenames in walk(source_root):
-        dirpath = Path(dirpath)
-        dirnames[:] = [d for d in dirnames if not is_excluded(Path(d))]
-        paths.extend(
-            dirpath / filename
-            for filename in filenames
-            if not is_excluded(dirpath / filename)
-        )
-    return paths
+    """Recursively collect all non-excluded, non-ignored file paths."""
+    return [Path(path) for path, _, _ in iter_source_files(source_root)]
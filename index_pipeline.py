@@ -0,0 +1,161 @@
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from queue import Empty, Queue
+from sqlite3 import Connection
+from threading import Thread
+from typing import Iterable
+
+import numpy as np
+from faiss import Index
+from openai import OpenAI
+from tqdm import tqdm
+
+from config import SkipReason
+from index_batches import (
+    count_skipped_files,
+    embed_text_batches,
+    iter_path_batches,
+    log_skipped_files,
+    split_embed_queue,
+)
+from index_db import ChunkedFile, SkippedFile, chunk_file_batch, store_file_batch
+from index_vectors import commit_vector_additions, commit_vector_removals
+from schemas import IndexConfig
+
+EmbedJob = tuple[list[str], list[int]]
+EmbedResult = tuple[np.ndarray, list[int]] | BaseException | None
+
+
+def iter_chunked_batches(
+    executor: ThreadPoolExecutor,
+    paths: Iterable[Path],
+    source_root: Path,
+    config: IndexConfig
+):
+    """Yield (file_count, (chunked_files, skipped_files)) in order, keeping `pipeline_depth` batches read ahead."""
+    pending: deque[tuple[int, Future]] = deque()
+    for file_batch in iter_path_batches(paths, config.file_batch_size):
+        pending.append((
+            len(file_batch),
+            executor.submit(
+                chunk_file_batch,
+                file_batch,
+                source_root,
+                config.chunk_size,
+                config.chunk_mode,
+                config.max_file_size
+            )
+        ))
+        if len(pending) > config.pipeline_depth:
+            file_count, future = pending.popleft()
+            yield file_count, future.result()
+    while pending:
+        file_count, future = pending.popleft()
+        yield file_count, future.result()
+
+
+def run_embed_worker(
+    client: OpenAI,
+    config: IndexConfig,
+    jobs: Queue[EmbedJob | None],
+    results: Queue[EmbedResult]
+) -> None:
+    try:
+        while (job := jobs.get()) is not None:
+            texts, vector_ids = job
+            results.put(embed_text_batches(
+                client=client,
+                texts=texts,
+                vector_ids=vector_ids,
+                model=config.model,
+                batch_size=config.embed_batch_size,
+                delay=config.embed_batch_delay,
+                concurrency=config.embed_concurrency
+            ))
+    except BaseException as exc:
+        results.put(exc)
+        while jobs.get() is not None:
+            pass
+    results.put(None)
+
+
+def write_embed_result(
+    meta_db: Connection,
+    faiss_index: Index,
+    index_root: Path,
+    result: EmbedResult
+) -> int:
+    if isinstance(result, BaseException):
+        raise result
+    if result is None:
+        return 0
+    vectors, vector_ids = result
+    return commit_vector_additions(meta_db, faiss_index, vectors, vector_ids, index_root)
+
+
+def drain_embed_results(
+    meta_db: Connection,
+    faiss_index: Index,
+    index_root: Path,
+    results: Queue[EmbedResult]
+) -> int:
+    added = 0
+    while True:
+        try:
+            result = results.get_nowait()
+        except Empty:
+            return added
+        added += write_embed_result(meta_db, faiss_index, index_root, result)
+
+
+def store_chunked_batch(
+    meta_db: Connection,
+    faiss_index: Index,
+    index_root: Path,
+    chunked_files: list[ChunkedFile],
+    skipped_files: list[SkippedFile],
+    jobs: Queue[EmbedJob | None]
+) -> None:
+    embed_queue, remove_ids = store_file_batch(meta_db, chunked_files, skipped_files)
+    commit_vector_removals(meta_db, faiss_index, remove_ids, index_root)
+    if embed_queue:
+        jobs.put(split_embed_queue(embed_queue))
+
+
+def run_index_pipeline(
+    meta_db: Connection,
+    faiss_index: Index,
+    client: OpenAI,
+    paths: Iterable[Path],
+    source_root: Path,
+    index_root: Path,
+    config: IndexConfig
+) -> int:
+    """Overlap reading/chunking, embedding and writing; this thread is the only SQLite/FAISS writer."""
+    jobs: Queue[EmbedJob | None] = Queue(maxsize=config.pipeline_depth)
+    results: Queue[EmbedResult] = Queue()
+    embed_worker = Thread(
+        target=run_embed_worker,
+        args=(client, config, jobs, results),
+        name="embed-worker",
+        daemon=True
+    )
+    embed_worker.start()
+    total_chunks = 0
+    skipped: Counter[SkipReason] = Counter()
+    with (
+        ThreadPoolExecutor(max_workers=config.read_workers, thread_name_prefix="chunk") as executor,
+        tqdm(desc="Processing files", unit="file") as pbar,
+    ):
+        for file_count, (chunked_files, skipped_files) in iter_chunked_batches(executor, paths, source_root, config):
+            count_skipped_files(skipped, skipped_files)
+            store_chunked_batch(meta_db, faiss_index, index_root, chunked_files, skipped_files, jobs)
+            total_chunks += drain_embed_results(meta_db, faiss_index, index_root, results)
+            pbar.update(file_count)
+        jobs.put(None)
+        while (result := results.get()) is not None:
+            total_chunks += write_embed_result(meta_db, faiss_index, index_root, result)
+    embed_worker.join()
+    log_skipped_files(skipped)
+    return total_chunks
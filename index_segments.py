@@ -0,0 +1,69 @@
+from pathlib import Path
+import os
+
+import numpy as np
+from faiss import Index
+
+from config import Constants
+
+
+def segment_dir(index_dir: Path) -> Path:
+    return index_dir / Constants.SEGMENTS.value
+
+
+def list_segments(index_dir: Path) -> list[Path]:
+    """List delta segments in the order they were written."""
+    directory = segment_dir(index_dir)
+    if not directory.exists():
+        return []
+    return sorted(directory.glob("*.npz"))
+
+
+def segment_generation(segment_file: Path) -> int:
+    return int(segment_file.stem)
+
+
+def write_segment(
+    index_dir: Path,
+    generation: int,
+    vector_ids: np.ndarray,
+    vectors: np.ndarray,
+    removed_ids: np.ndarray
+) -> None:
+    """Atomically write the delta segment for `generation`."""
+    directory = segment_dir(index_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    segment_file = directory / f"{generation:08d}.npz"
+    temp_file = segment_file.with_suffix(".tmp")
+    with open(temp_file, "wb") as handle:
+        np.savez(handle, ids=vector_ids, vectors=vectors, removed=removed_ids)
+    os.replace(temp_file, segment_file)
+
+
+def read_segment_ids(segment_file: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Return (added_ids, removed_ids) of a segment."""
+    with np.load(segment_file) as segment:
+        return segment["ids"].astype("int64"), segment["removed"].astype("int64")
+
+
+def apply_segment(index: Index, segment_file: Path) -> None:
+    """Replay one segment; removing touched ids first makes replay idempotent."""
+    with np.load(segment_file) as segment:
+        vector_ids = segment["ids"].astype("int64")
+        vectors = segment["vectors"].astype("float32")
+        removed_ids = segment["removed"].astype("int64")
+    touched = np.concatenate([removed_ids, vector_ids])
+    if len(touched):
+        index.remove_ids(touched)
+    if len(vector_ids):
+        index.add_with_ids(vectors, vector_ids)
+
+
+def apply_segments(index: Index, index_dir: Path) -> None:
+    for segment_file in list_segments(index_dir):
+        apply_segment(index, segment_file)
+
+
+def clear_segments(index_dir: Path) -> None:
+    for segment_file in list_segments(index_dir):
+        segment_file.unlink()
@@ -1,47 +1,52 @@
+from pathlib import Path
 from sqlite3 import Connection
 
-from faiss import Index
+from faiss import Index, vector_to_array
 
 from config import get_logger
-from index_store import save_index
+from database import commit_generation, get_generation
+from index_segments import list_segments, read_segment_ids, segment_generation
+from index_store import ensure_root
+from index_vectors import commit_vector_removals, mark_chunks_indexed
 
 LOGGER = get_logger()
 
 
-def reconcile_index_state(meta_db: Connection, faiss_index: Index, index_root) -> None:
-    db_count = count_chunks(meta_db)
-    index_count = faiss_index.ntotal
-    if db_count == 0:
-        return
-    if index_count == 0:
-        mark_all_unindexed(meta_db)
-        return
-    if index_count == db_count:
-        mark_all_indexed(meta_db)
-        return
-    LOGGER.warning(
-        "FAISS index count does not match metadata; resetting vectors to prevent mismatch."
-    )
-    reset_index(meta_db, faiss_index, index_root)
-
-
-def count_chunks(meta_db: Connection) -> int:
-    cursor = meta_db.execute("SELECT COUNT(*) FROM chunks")
-    row = cursor.fetchone()
-    return int(row[0]) if row else 0
-
-
-def mark_all_unindexed(meta_db: Connection) -> None:
-    meta_db.execute("UPDATE chunks SET indexed = 0")
-    meta_db.commit()
-
-
-def mark_all_indexed(meta_db: Connection) -> None:
-    meta_db.execute("UPDATE chunks SET indexed = 1 WHERE indexed = 0")
-    meta_db.commit()
-
-
-def reset_index(meta_db: Connection, faiss_index: Index, index_root) -> None:
-    faiss_index.reset()
-    save_index(faiss_index, index_root)
-    mark_all_unindexed(meta_db)
+def reconcile_index_state(meta_db: Connection, faiss_index: Index, index_root: Path) -> None:
+    """Recover a consistent generation after an interrupted run instead of discarding vectors."""
+    roll_forward_segments(meta_db, ensure_root(index_root))
+    repair_vector_ids(meta_db, faiss_index, index_root)
+
+
+def roll_forward_segments(meta_db: Connection, index_dir: Path) -> None:
+    """Commit segments that reached disk after the last metadata commit.
+
+    Added vectors were embedded from already committed chunk rows, so they are
+    marked indexed; removed vectors belong to rows whose update was lost, so
+    those rows are marked for re-embedding.
+    """
+    generation = get_generation(meta_db)
+    for segment_file in list_segments(index_dir):
+        segment = segment_generation(segment_file)
+        if segment <= generation:
+            continue
+        LOGGER.warning(f"Rolling forward uncommitted vector generation {segment}.")
+        added_ids, removed_ids = read_segment_ids(segment_file)
+        mark_chunks_indexed(meta_db, removed_ids.tolist(), indexed=0)
+        mark_chunks_indexed(meta_db, added_ids.tolist())
+        commit_generation(meta_db, segment)
+        generation = segment
+
+
+def repair_vector_ids(meta_db: Connection, faiss_index: Index, index_root: Path) -> None:
+    """Drop vectors without an indexed chunk and re-queue indexed chunks without a vector."""
+    vector_ids = set(vector_to_array(faiss_index.id_map).tolist())
+    indexed_ids = {int(row[0]) for row in meta_db.execute("SELECT id FROM chunks WHERE indexed = 1")}
+    missing = sorted(indexed_ids - vector_ids)
+    stale = sorted(vector_ids - indexed_ids)
+    if missing:
+        LOGGER.warning(f"{len(missing)} indexed chunks have no vector; queueing them for re-embedding.")
+        mark_chunks_indexed(meta_db, missing, indexed=0)
+    if stale:
+        LOGGER.warning(f"Removing {len(stale)} vectors that no indexed chunk refers to.")
+    commit_vector_removals(meta_db, faiss_index, stale, index_root)
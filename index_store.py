@@ -1,10 +1,20 @@
 from pathlib import Path
+import os
 import shutil
 
 import numpy as np
-from faiss import Index, IndexFlatL2, IndexIDMap2, read_index, write_index
+from faiss import (
+    IO_FLAG_MMAP_IFC,
+    IO_FLAG_READ_ONLY,
+    Index,
+    IndexFlatL2,
+    IndexIDMap2,
+    read_index,
+    write_index,
+)
 
 from config import Constants, get_logger
+from index_segments import apply_segments, clear_segments, list_segments, write_segment
 
 LOGGER = get_logger()
 
@@ -35,14 +45,71 @@ def ensure_index(index_root: Path) -> Index:
         index = IndexIDMap2(IndexFlatL2(Constants.DIMENSIONS.value))
     if not hasattr(index, "add_with_ids"):
         index = upgrade_index_to_id_map(index)
+    apply_segments(index, index_root)
+    return index
+
+
+def read_index_mapped(index_file: Path, mmap_flag: int) -> Index | None:
+    """Memory-map an index read-only so query processes share its page-cache pages.
+
+    The returned index must never be modified. Returns None if it cannot be mapped.
+    """
+    try:
+        return read_index(str(index_file), mmap_flag | IO_FLAG_READ_ONLY)
+    except RuntimeError as exc:
+        LOGGER.warning(f"Could not memory-map {index_file.name}, loading it into memory: {exc}")
+        return None
+
+
+def load_query_index(index_root: Path) -> Index:
+    """Load the flat store for read-only queries, memory-mapped unless segments are pending."""
+    index_dir = ensure_root(index_root)
+    index_file = index_dir / Constants.VECTORS.value
+    if not index_file.exists() or list_segments(index_dir):
+        return ensure_index(index_root)
+    index = read_index_mapped(index_file, IO_FLAG_MMAP_IFC)
+    if index is None or not hasattr(index, "add_with_ids"):
+        return ensure_index(index_root)
     return index
 
 
 def save_index(index: Index, index_root: Path) -> None:
-    """Save FAISS index to disk."""
+    """Write the full FAISS index as the new base and drop the delta segments it absorbs."""
     index_root = ensure_root(index_root)
     index_file = index_root / Constants.VECTORS.value
-    write_index(index, str(index_file))
+    temp_file = index_file.with_suffix(".tmp")
+    write_index(index, str(temp_file))
+    os.replace(temp_file, index_file)
+    clear_segments(index_root)
+
+
+def append_segment(
+    index_root: Path,
+    generation: int,
+    vector_ids: np.ndarray | None = None,
+    vectors: np.ndarray | None = None,
+    removed_ids: np.ndarray | None = None
+) -> None:
+    """Persist a batch of vector changes as the delta segment for `generation`."""
+    index_root = ensure_root(index_root)
+    dimensions = Constants.DIMENSIONS.value
+    write_segment(
+        index_root,
+        generation,
+        vector_ids if vector_ids is not None else np.empty(0, dtype="int64"),
+        vectors if vectors is not None else np.empty((0, dimensions), dtype="float32"),
+        removed_ids if removed_ids is not None else np.empty(0, dtype="int64")
+    )
+
+
+def compact_index(index: Index, index_root: Path, max_segments: int = 0) -> None:
+    """Fold delta segments into the base once more than `max_segments` exist.
+
+    Only call this once every segment is committed, so the base never holds
+    vectors the metadata does not know about.
+    """
+    if len(list_segments(ensure_root(index_root))) > max_segments:
+        save_index(index, index_root)
 
 
 def upgrade_index_to_id_map(index: Index) -> Index:
@@ -3,37 +3,78 @@ from sqlite3 import Connection
 import numpy as np
 from faiss import Index
 
-from index_store import save_index
+from config import Constants
+from database import commit_generation, get_generation
+from index_store import append_segment, compact_index
 
 
 def add_vectors(
     faiss_index: Index,
-    vectors: list[list[float]],
+    vectors: np.ndarray,
     vector_ids: list[int],
-    index_root
+    index_root,
+    generation: int
 ) -> int:
-    if not vectors:
+    if not len(vectors):
         return 0
-    vector_array = np.array(vectors, dtype='float32')
+    vector_array = np.ascontiguousarray(vectors, dtype='float32')
     id_array = np.array(vector_ids, dtype='int64')
     faiss_index.add_with_ids(vector_array, id_array)
-    save_index(faiss_index, index_root)
+    append_segment(index_root, generation, vector_ids=id_array, vectors=vector_array)
     return len(vectors)
 
 
-def remove_vectors(faiss_index: Index, vector_ids: list[int]) -> None:
+def remove_vectors(
+    faiss_index: Index,
+    vector_ids: list[int],
+    index_root,
+    generation: int
+) -> None:
     if not vector_ids:
         return
     id_array = np.array(vector_ids, dtype='int64')
     faiss_index.remove_ids(id_array)
+    append_segment(index_root, generation, removed_ids=id_array)
+
 
+def mark_chunks_indexed(meta_db: Connection, chunk_ids: list[int], indexed: int = 1) -> None:
+    for i in range(0, len(chunk_ids), Constants.SQL_BATCH_SIZE.value):
+        id_batch = chunk_ids[i:i + Constants.SQL_BATCH_SIZE.value]
+        placeholders = ",".join("?" for _ in id_batch)
+        meta_db.execute(
+            f"UPDATE chunks SET indexed = ? WHERE id IN ({placeholders})",
+            [indexed, *id_batch]
+        )
 
-def mark_chunks_indexed(meta_db: Connection, chunk_ids: list[int]) -> None:
-    if not chunk_ids:
+
+def commit_vector_removals(
+    meta_db: Connection,
+    faiss_index: Index,
+    remove_ids: list[int],
+    index_root
+) -> None:
+    """Write removals as the next generation's segment, then commit the open metadata transaction."""
+    if not remove_ids:
+        meta_db.commit()
         return
-    placeholders = ",".join("?" for _ in chunk_ids)
-    meta_db.execute(
-        f"UPDATE chunks SET indexed = 1 WHERE id IN ({placeholders})",
-        chunk_ids
-    )
-    meta_db.commit()
+    generation = get_generation(meta_db) + 1
+    remove_vectors(faiss_index, remove_ids, index_root, generation)
+    commit_generation(meta_db, generation)
+
+
+def commit_vector_additions(
+    meta_db: Connection,
+    faiss_index: Index,
+    vectors: np.ndarray,
+    vector_ids: list[int],
+    index_root
+) -> int:
+    """Write new vectors as the next generation's segment, then mark their chunks indexed with it."""
+    if not len(vectors):
+        return 0
+    generation = get_generation(meta_db) + 1
+    added = add_vectors(faiss_index, vectors, vector_ids, index_root, generation)
+    mark_chunks_indexed(meta_db, vector_ids)
+    commit_generation(meta_db, generation)
+    compact_index(faiss_index, index_root, Constants.MAX_SEGMENTS.value)
+    return added
@@ -1,33 +1,83 @@
+from os import stat_result
 from pathlib import Path
 from sqlite3 import Connection
+from typing import Iterator
 import time
 
+from faiss import Index
 from openai import OpenAI
 
 from config import get_logger
 from database import ensure_db
+from index_ann import refresh_search_index
 from index_batches import run_index_batches
-from index_db import get_indexed_files
-from index_paths import collect_paths
+from index_db import backfill_lexical_index, delete_file_chunks, get_file_states
+from index_pipeline import run_index_pipeline
+from index_paths import iter_source_files
 from index_state import reconcile_index_state
-from index_store import ensure_index
+from index_store import compact_index, ensure_index
+from index_vectors import commit_vector_removals
 from schemas import IndexConfig
 
 LOGGER = get_logger()
 
 
-def get_paths_to_index(
-    source_root: Path,
+def is_file_unchanged(file_stat: stat_result | None, state: tuple[int, float, bool] | None) -> bool:
+    if state is None or not state[2] or file_stat is None:
+        return False
+    return file_stat.st_size == state[0] and file_stat.st_mtime == state[1]
+
+
+class SourceScan:
+    """Stream new or modified files straight from the walker, remembering every file it saw.
+
+    Deleted files are only known once the walk is exhausted, so `deleted()` must be
+    called after iterating. Files under a directory that could not be listed are not
+    reported as deleted, since the walk never saw whether they still exist.
+    """
+
+    def __init__(self, source_root: Path, file_states: dict[str, tuple[int, float, bool]]) -> None:
+        self.source_root = source_root
+        self.file_states = file_states
+        self.seen: set[str] = set()
+        self.unlisted: list[str] = []
+        self.changed = 0
+
+    def __iter__(self) -> Iterator[Path]:
+        for path, relative_path, file_stat in iter_source_files(self.source_root, unlisted=self.unlisted):
+            self.seen.add(relative_path)
+            if not is_file_unchanged(file_stat, self.file_states.get(relative_path)):
+                self.changed += 1
+                yield Path(path)
+
+    def deleted(self) -> list[str]:
+        unlisted = tuple(self.unlisted)
+        return [
+            file_path for file_path in self.file_states
+            if file_path not in self.seen and not file_path.startswith(unlisted)
+        ]
+
+    def log_summary(self) -> None:
+        if self.file_states:
+            LOGGER.info(
+                f"Found {len(self.seen) - self.changed} unchanged, {self.changed} new or modified "
+                f"and {len(self.deleted())} deleted files."
+            )
+        if self.unlisted:
+            LOGGER.warning(f"Kept files under {len(self.unlisted)} unreadable directories as they were.")
+
+
+def purge_deleted_files(
     meta_db: Connection,
-    erase: bool
-) -> list[Path]:
-    paths = collect_paths(source_root)
-    if erase:
-        return paths
-    indexed_files = get_indexed_files(meta_db)
-    if indexed_files:
-        LOGGER.info(f"Found {len(indexed_files)} already indexed files, skipping them.")
-    return [p for p in paths if str(p.relative_to(source_root)) not in indexed_files]
+    faiss_index: Index,
+    index_root: Path,
+    deleted: list[str]
+) -> None:
+    if not deleted:
+        return
+    removed_ids = delete_file_chunks(meta_db, deleted)
+    commit_vector_removals(meta_db, faiss_index, removed_ids, index_root)
+    LOGGER.info(f"Purged {len(deleted)} deleted files ({len(removed_ids)} vectors).")
 
 
 def log_index_summary(start_time: float, total_chunks: int, path_count: int) -> None:
@@ -38,32 +88,53 @@ def log_index_summary(start_time: float, total_chunks: int, path_count: int) ->
     )
 
 
-def run_indexing(
+def update_index(
+    meta_db: Connection,
+    faiss_index: Index,
+    client: OpenAI,
     source_root: Path,
     index_root: Path,
     config: IndexConfig,
-    client: OpenAI,
     erase: bool
-) -> None:
-    start_time = time.time()
-    meta_db = ensure_db(index_root)
-    faiss_index = ensure_index(index_root)
+) -> tuple[int, int]:
     reconcile_index_state(meta_db, faiss_index, index_root)
+    backfill_lexical_index(meta_db, source_root)
     LOGGER.info(f"Indexing files from {source_root} into index at {index_root}")
-    paths = get_paths_to_index(source_root, meta_db, erase)
-    LOGGER.info(f"Collected {len(paths)} files to index.")
-    if not paths:
-        LOGGER.warning("No new files to index.")
-        meta_db.close()
-        return
-    total_chunks = run_index_batches(
+    scan = SourceScan(source_root, {} if erase else get_file_states(meta_db, config.max_file_size))
+    run_batches = run_index_pipeline if config.pipeline_depth > 0 else run_index_batches
+    total_chunks = run_batches(
         meta_db=meta_db,
         faiss_index=faiss_index,
         client=client,
-        paths=paths,
+        paths=scan,
         source_root=source_root,
         index_root=index_root,
         config=config
     )
-    meta_db.close()
-    log_index_summary(start_time, total_chunks, len(paths))
+    scan.log_summary()
+    purge_deleted_files(meta_db, faiss_index, index_root, scan.deleted())
+    if not scan.changed:
+        LOGGER.warning("No new or modified files to index.")
+    return total_chunks, scan.changed
+
+
+def run_indexing(
+    source_root: Path,
+    index_root: Path,
+    config: IndexConfig,
+    client: OpenAI,
+    erase: bool
+) -> None:
+    start_time = time.time()
+    meta_db = ensure_db(index_root)
+    faiss_index = ensure_index(index_root)
+    try:
+        total_chunks, path_count = update_index(
+            meta_db, faiss_index, client, source_root, index_root, config, erase
+        )
+        refresh_search_index(meta_db, faiss_index, index_root, config)
+        compact_index(faiss_index, index_root)
+    finally:
+        meta_db.close()
+    if path_count:
+        log_index_summary(start_time, total_chunks, path_count)
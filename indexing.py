@@ -1,10 +1,10 @@
 from chunking import build_chunk, chunk_file
 from embeddings import generate_embeddings_batch
 from index_db import (
-    get_indexed_files,
-    process_file_batch,
-    read_chunk_content,
-    read_chunk_with_context,
+    is_source_unchanged,
+    read_chunk_snippet,
+    read_source_text,
+    slice_chunk_context,
 )
 from index_paths import collect_paths, is_excluded
 from index_store import (
@@ -22,10 +22,10 @@ __all__ = [
     "ensure_root",
     "erase_index",
     "generate_embeddings_batch",
-    "get_indexed_files",
     "is_excluded",
-    "process_file_batch",
-    "read_chunk_content",
-    "read_chunk_with_context",
+    "is_source_unchanged",
+    "read_chunk_snippet",
+    "read_source_text",
     "save_index",
+    "slice_chunk_context",
 ]
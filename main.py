@@ -1,8 +1,7 @@
-from typer import Typer
+from typer import Option, Typer
 from pathlib import Path
 
-from config import Constants
-from cli_handlers import handle_ask, handle_index, handle_query
+from config import ChunkMode, Constants, IndexType, SearchMode, VectorStorage
 
 CWD = Path.cwd()
 APP = Typer()
@@ -16,11 +15,38 @@ def index(
     api_key: str = "not-needed",
     model: str = Constants.MODEL.value,
     chunk_size: int = Constants.CHUNK_SIZE.value,
+    chunk_mode: ChunkMode = ChunkMode.FIXED,
+    max_file_size: int = Constants.MAX_FILE_SIZE.value,
     file_batch_size: int = Constants.FILE_BATCH_SIZE.value,
     embed_batch_size: int = Constants.EMBED_BATCH_SIZE.value,
     embed_batch_delay: float = 0.0,
+    embed_concurrency: int = Constants.EMBED_CONCURRENCY.value,
+    pipeline_depth: int = Constants.PIPELINE_DEPTH.value,
+    read_workers: int = Constants.READ_WORKERS.value,
+    index_type: IndexType | None = Option(
+        None,
+        help=(
+            "Search index type; --nlist, --hnsw-m and --pq-m tune it. Options left out keep the "
+            "values the index was last built with, or auto and the built-in defaults on a new index."
+        ),
+    ),
+    storage: VectorStorage | None = Option(
+        None,
+        help=(
+            "Encoding of the search index, kept like --index-type when left out. On 200k vectors "
+            "sq8 shrinks an HNSW search.faiss from 249 to 102 MB and pq an IVF one to 9 MB. The "
+            "float32 index.faiss (197 MB) stays beside it for incremental updates and re-ranking, so "
+            "total disk use grows. Queries without re-ranking (--rerank 0) touch only search.faiss; "
+            "re-ranking reads the memory-mapped index.faiss, whose pages then fill the page cache."
+        ),
+    ),
+    nlist: int | None = None,
+    hnsw_m: int | None = None,
+    pq_m: int | None = None,
     erase: bool = False,
 ) -> None:
+    from cli_handlers import handle_index
+
     handle_index(
         source_root=source_root,
         index_root=index_root,
@@ -28,9 +54,19 @@ def index(
         api_key=api_key,
         model=model,
         chunk_size=chunk_size,
+        chunk_mode=chunk_mode,
+        max_file_size=max_file_size,
         file_batch_size=file_batch_size,
         embed_batch_size=embed_batch_size,
         embed_batch_delay=embed_batch_delay,
+        embed_concurrency=embed_concurrency,
+        pipeline_depth=pipeline_depth,
+        read_workers=read_workers,
+        index_type=index_type,
+        storage=storage,
+        nlist=nlist,
+        hnsw_m=hnsw_m,
+        pq_m=pq_m,
         erase=erase,
     )
 
@@ -42,8 +78,33 @@ def query(
     api_base: str = "http://localhost:11434/v1",
     api_key: str = "not-needed",
     model: str = Constants.MODEL.value,
-    limit: int = 5
+    limit: int = 5,
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    disk_cache: bool = True,
+    search_mode: SearchMode = SearchMode.VECTOR,
+    path_prefix: str = "",
+    glob: str = "",
+    extension: list[str] | None = None,
+    server: str = ""
 ) -> None:
+    if server:
+        from query_client import handle_remote_query
+
+        handle_remote_query(
+            server,
+            query_str,
+            limit,
+            nprobe,
+            ef_search,
+            rerank,
+            search_mode,
+            {"path_prefix": path_prefix, "glob": glob, "extensions": extension or []}
+        )
+        return
+    from cli_handlers import handle_query
+
     handle_query(
         query_str=query_str,
         index_root=index_root,
@@ -51,6 +112,59 @@ def query(
         api_key=api_key,
         model=model,
         limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
+        path_prefix=path_prefix,
+        glob=glob,
+        extensions=extension or [],
+    )
+
+
+@APP.command()
+def batch_query(
+    input_path: str,
+    output_path: Path,
+    source_root: Path = CWD,
+    index_root: Path = CWD,
+    api_base: str = "http://localhost:11434/v1",
+    api_key: str = "not-needed",
+    model: str = Constants.MODEL.value,
+    limit: int = 5,
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    disk_cache: bool = True,
+    search_mode: SearchMode = SearchMode.VECTOR,
+    path_prefix: str = "",
+    glob: str = "",
+    extension: list[str] | None = None,
+    batch_size: int = Constants.EMBED_BATCH_SIZE.value,
+    include_content: bool = False
+) -> None:
+    from cli_handlers import handle_batch_query
+
+    handle_batch_query(
+        input_path=input_path,
+        output_path=output_path,
+        source_root=source_root,
+        index_root=index_root,
+        api_base=api_base,
+        api_key=api_key,
+        model=model,
+        limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
+        path_prefix=path_prefix,
+        glob=glob,
+        extensions=extension or [],
+        batch_size=batch_size,
+        include_content=include_content,
     )
 
 
@@ -64,8 +178,39 @@ def ask(
     embed_model: str = Constants.MODEL.value,
     ai_model: str = "llama3.2",
     limit: int = 5,
-    tool_max_retries: int = 3
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    disk_cache: bool = True,
+    search_mode: SearchMode = SearchMode.VECTOR,
+    tool_max_retries: int = 3,
+    context_tokens: int = Constants.ASK_CONTEXT_TOKENS.value,
+    stream: bool = True,
+    server: str = Option(
+        "",
+        help=(
+            "URL of a running `serve` process to ask instead. The search options above are sent "
+            "along; the models, index and caches are the server's own."
+        ),
+    )
 ) -> None:
+    if server:
+        from query_client import handle_remote_ask
+
+        handle_remote_ask(
+            server,
+            question,
+            limit,
+            nprobe,
+            ef_search,
+            rerank,
+            search_mode,
+            tool_max_retries,
+            context_tokens
+        )
+        return
+    from cli_handlers import handle_ask
+
     handle_ask(
         question=question,
         source_root=source_root,
@@ -75,7 +220,59 @@ def ask(
         embed_model=embed_model,
         ai_model=ai_model,
         limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
+        tool_max_retries=tool_max_retries,
+        context_tokens=context_tokens,
+        stream=stream,
+    )
+
+
+@APP.command()
+def serve(
+    source_root: Path = CWD,
+    index_root: Path = CWD,
+    api_base: str = "http://localhost:11434/v1",
+    api_key: str = "not-needed",
+    embed_model: str = Constants.MODEL.value,
+    ai_model: str = "llama3.2",
+    host: str = Constants.SERVE_HOST.value,
+    port: int = Constants.SERVE_PORT.value,
+    limit: int = 5,
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    disk_cache: bool = True,
+    search_mode: SearchMode = SearchMode.VECTOR,
+    tool_max_retries: int = 3,
+    context_tokens: int = Constants.ASK_CONTEXT_TOKENS.value,
+    batch_window_ms: float = Constants.SERVE_BATCH_WINDOW_MS.value,
+    max_batch: int = Constants.SERVE_MAX_BATCH.value
+) -> None:
+    from cli_handlers import handle_serve
+
+    handle_serve(
+        source_root=source_root,
+        index_root=index_root,
+        api_base=api_base,
+        api_key=api_key,
+        embed_model=embed_model,
+        ai_model=ai_model,
+        host=host,
+        port=port,
+        limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        search_mode=search_mode,
         tool_max_retries=tool_max_retries,
+        context_tokens=context_tokens,
+        batch_window_ms=batch_window_ms,
+        max_batch=max_batch,
     )
 
 
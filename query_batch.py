@@ -0,0 +1,75 @@
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+import json
+import sys
+import time
+
+from openai import OpenAI
+
+from config import get_logger
+from schemas import BatchQueryConfig
+from search_engine import get_search_engine
+
+LOGGER = get_logger()
+
+
+def read_queries(input_file: TextIO) -> list[str]:
+    """Read one query per non-blank line."""
+    return [line.strip() for line in input_file if line.strip()]
+
+
+def iter_batch_results(
+    queries: list[str],
+    source_root: Path,
+    index_root: Path,
+    client: OpenAI,
+    config: BatchQueryConfig
+) -> Iterator[dict[str, Any]]:
+    """Answer queries `batch_size` at a time, each slice with one embedding request and one FAISS search."""
+    engine = get_search_engine(index_root)
+    for i in range(0, len(queries), config.batch_size):
+        query_batch = queries[i:i + config.batch_size]
+        answers = engine.search_batch(
+            query_batch,
+            source_root,
+            client,
+            config.model,
+            config.limit,
+            config.nprobe,
+            config.ef_search,
+            config.rerank,
+            config.disk_cache,
+            config.include_content,
+            search_mode=config.search_mode,
+            search_filter=config.search_filter,
+        )
+        for query_str, (results, error) in zip(query_batch, answers):
+            yield {"query": query_str, "results": results, "error": error}
+
+
+def run_batch_queries(
+    input_path: str,
+    output_path: Path,
+    source_root: Path,
+    index_root: Path,
+    client: OpenAI,
+    config: BatchQueryConfig
+) -> None:
+    """Read queries from a file or stdin (`-`) and write one JSON result line per query to `output_path`.
+
+    Results never go to stdout, which carries the log output.
+    """
+    start_time = time.time()
+    if input_path == "-":
+        queries = read_queries(sys.stdin)
+    else:
+        with open(input_path, encoding='utf-8') as input_file:
+            queries = read_queries(input_file)
+    errors = 0
+    with open(output_path, "w", encoding='utf-8') as output_file:
+        for record in iter_batch_results(queries, source_root, index_root, client, config):
+            errors += record["error"] is not None
+            output_file.write(json.dumps(record) + "\n")
+    LOGGER.info(
+        f"Answered {len(queries)} queries ({errors} failed) in {time.time() - start_time:.1f}s."
+    )
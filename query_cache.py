@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+from sqlite3 import Connection, Error, connect
+from threading import Lock
+from typing import Any
+import time
+
+import numpy as np
+
+from config import Constants, get_logger
+
+LOGGER = get_logger()
+
+
+class LRUCache:
+    """A thread-safe mapping that evicts the least recently used entry once full."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Any, Any] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: Any) -> Any:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: Any, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+class ResultCache(LRUCache):
+    """Top-k hits per query vector and search settings, dropped whenever the index generation moves."""
+
+    def __init__(self, max_entries: int) -> None:
+        super().__init__(max_entries)
+        self.generation: int | None = None
+
+    def get_hits(self, generation: int, key: Any) -> Any:
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+            return None
+        return self.get(key)
+
+    def put_hits(self, generation: int, key: Any, hits: Any) -> None:
+        if generation == self.generation:
+            self.put(key, hits)
+
+
+EMBEDDING_CACHE = LRUCache(Constants.QUERY_EMBEDDING_CACHE_SIZE.value)
+
+
+def embedding_cache_key(model: str, dimensions: int, prefixed_query: str) -> str:
+    return sha256(f"{model}\0{dimensions}\0{prefixed_query}".encode('utf-8')).hexdigest()
+
+
+def result_cache_key(query_vector: np.ndarray, *settings: Any) -> tuple[Any, ...]:
+    vector_hash = sha256(np.asarray(query_vector, dtype='float32').tobytes()).hexdigest()
+    return (vector_hash, *settings)
+
+
+class EmbeddingStore:
+    """Query embeddings persisted beside one index, shared by every thread through one connection.
+
+    Lookups never write: the keys they hit are remembered and their `used_at` is
+    bumped with the next write, and the store is pruned back to its cap only every
+    QUERY_CACHE_PRUNE_INTERVAL inserts.
+    """
+
+    def __init__(self, index_root: Path) -> None:
+        self.path = index_root / Constants.INDEX.value / Constants.QUERY_CACHE.value
+        self.lock = Lock()
+        self.connection: Connection | None = None
+        self.touched: set[str] = set()
+        self.inserts = 0
+
+    def connect(self) -> Connection:
+        if self.connection is None:
+            connection = connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            connection.commit()
+            self.connection = connection
+        return self.connection
+
+    def read(self, keys: list[str]) -> dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" for _ in keys)
+        try:
+            with self.lock:
+                rows = self.connect().execute(
+                    f"SELECT key, vector FROM query_embeddings WHERE key IN ({placeholders})", keys
+                ).fetchall()
+                self.touched.update(row[0] for row in rows)
+        except Error as exc:
+            LOGGER.warning(f"Query embedding store unavailable: {exc}")
+            return {}
+        return {row[0]: np.frombuffer(row[1], dtype='float32') for row in rows}
+
+    def write(self, embeddings: dict[str, np.ndarray]) -> None:
+        """Store new embeddings and pending `used_at` bumps in one transaction."""
+        if not embeddings:
+            return
+        now = time.time()
+        try:
+            with self.lock:
+                connection = self.connect()
+                connection.executemany(
+                    "UPDATE query_embeddings SET used_at = ? WHERE key = ?",
+                    [(now, key) for key in self.touched]
+                )
+                connection.executemany("""
+                    INSERT INTO query_embeddings (key, vector, used_at) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET vector = excluded.vector, used_at = excluded.used_at
+                """, [
+                    (key, np.asarray(embedding, dtype='float32').tobytes(), now)
+                    for key, embedding in embeddings.items()
+                ])
+                self.touched.clear()
+                self.inserts += len(embeddings)
+                if self.inserts >= Constants.QUERY_CACHE_PRUNE_INTERVAL.value:
+                    self.prune(connection)
+                connection.commit()
+        except Error as exc:
+            LOGGER.warning(f"Could not store query embeddings: {exc}")
+
+    def prune(self, connection: Connection) -> None:
+        connection.execute("""
+            DELETE FROM query_embeddings WHERE key NOT IN (
+                SELECT key FROM query_embeddings ORDER BY used_at DESC LIMIT ?
+            )
+        """, (Constants.QUERY_CACHE_DISK_ENTRIES.value,))
+        self.inserts = 0
+
+
+EMBEDDING_STORES: dict[Path, EmbeddingStore] = {}
+EMBEDDING_STORES_LOCK = Lock()
+
+
+def get_embedding_store(index_root: Path) -> EmbeddingStore:
+    """Return the process-wide embedding store for `index_root`, opening it on first use."""
+    key = index_root.resolve()
+    with EMBEDDING_STORES_LOCK:
+        store = EMBEDDING_STORES.get(key)
+        if store is None:
+            store = EmbeddingStore(index_root)
+            EMBEDDING_STORES[key] = store
+        return store
+
+
+def get_cached_embeddings(keys: list[str], cache_root: Path | None) -> list[np.ndarray | None]:
+    """Look query embeddings up in memory, then the misses in the on-disk store if one is given."""
+    embeddings = [EMBEDDING_CACHE.get(key) for key in keys]
+    missing = [key for key, embedding in zip(keys, embeddings) if embedding is None]
+    if not missing or cache_root is None:
+        return embeddings
+    stored = get_embedding_store(cache_root).read(list(dict.fromkeys(missing)))
+    for key, embedding in stored.items():
+        EMBEDDING_CACHE.put(key, embedding)
+    return [embedding if embedding is not None else stored.get(key) for key, embedding in zip(keys, embeddings)]
+
+
+def put_cached_embeddings(embeddings: dict[str, np.ndarray], cache_root: Path | None) -> None:
+    for key, embedding in embeddings.items():
+        EMBEDDING_CACHE.put(key, embedding)
+    if cache_root is not None:
+        get_embedding_store(cache_root).write(embeddings)
@@ -0,0 +1,92 @@
+from typing import Any
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import json
+
+from cli_output import log_query_results, print_answer
+from config import Constants, get_logger
+
+LOGGER = get_logger()
+
+
+def post_json(
+    server: str,
+    path: str,
+    payload: dict[str, Any],
+    timeout: float
+) -> tuple[dict[str, Any] | None, str | None]:
+    """POST `payload` and return the decoded reply, including the JSON body of an error status."""
+    request = Request(
+        f"{server.rstrip('/')}{path}",
+        data=json.dumps(payload).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read()), None
+    except HTTPError as exc:
+        try:
+            body = json.loads(exc.read())
+        except (OSError, ValueError):
+            body = None
+        if isinstance(body, dict) and body.get("error"):
+            return body, None
+        return None, f"Query server at {server} failed: {exc}"
+    except (OSError, ValueError) as exc:
+        return None, f"Query server at {server} failed: {exc}"
+
+
+def handle_remote_query(
+    server: str,
+    query_str: str,
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    search_mode: str,
+    search_filter: dict[str, Any]
+) -> None:
+    """Send a query to a running `serve` process instead of loading the index here."""
+    response, error = post_json(server, "/query", {
+        "query": query_str,
+        "limit": limit,
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "rerank": rerank,
+        "search_mode": search_mode,
+        "search_filter": search_filter,
+    }, Constants.SERVE_QUERY_TIMEOUT.value)
+    error = error or (response or {}).get("error")
+    if error:
+        LOGGER.error(error)
+        return
+    log_query_results(response["results"])
+
+
+def handle_remote_ask(
+    server: str,
+    question: str,
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    search_mode: str,
+    tool_max_retries: int,
+    context_tokens: int
+) -> None:
+    """Ask a running `serve` process, which answers with its own models and index."""
+    response, error = post_json(server, "/ask", {
+        "question": question,
+        "limit": limit,
+        "nprobe": nprobe,
+        "ef_search": ef_search,
+        "rerank": rerank,
+        "search_mode": search_mode,
+        "tool_max_retries": tool_max_retries,
+        "context_tokens": context_tokens,
+    }, Constants.SERVE_ASK_TIMEOUT.value)
+    error = error or (response or {}).get("error")
+    if error:
+        LOGGER.error(error)
+        return
+    print_answer(question, response["answer"])
@@ -0,0 +1,204 @@
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Thread
+from typing import Any
+import json
+import time
+
+from openai import OpenAI
+from pydantic import ValidationError
+
+from assistant_loop import run_assistant_loop
+from config import get_logger
+from schemas import AskConfig, AskRequest, QueryRequest, ServeConfig
+from search_engine import SearchEngine, get_search_engine
+
+LOGGER = get_logger()
+
+PendingQuery = tuple[QueryRequest, Future]
+
+
+class QueryHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QueryBatcher:
+    """Collect concurrent /query requests and answer those sharing search settings together.
+
+    One worker drains whatever arrived within the batch window, so requests that
+    queue up behind an embedding round trip are embedded and searched as one batch.
+    """
+
+    def __init__(
+        self,
+        engine: SearchEngine,
+        client: OpenAI,
+        config: ServeConfig,
+        source_root: Path
+    ) -> None:
+        self.engine = engine
+        self.client = client
+        self.config = config
+        self.source_root = source_root
+        self.pending: Queue[PendingQuery] = Queue()
+        self.worker = Thread(target=self.run, name="query-batcher", daemon=True)
+
+    def start(self) -> None:
+        self.worker.start()
+
+    def submit(self, request: QueryRequest) -> tuple[list[dict[str, Any]], str | None]:
+        future: Future = Future()
+        self.pending.put((request, future))
+        return future.result()
+
+    def collect(self) -> list[PendingQuery]:
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.config.batch_window_ms / 1000
+        while len(batch) < self.config.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self.pending.get(timeout=timeout) if timeout > 0 else self.pending.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def settings(self, request: QueryRequest) -> tuple[Any, ...]:
+        return (
+            request.limit or self.config.limit,
+            request.nprobe or self.config.nprobe,
+            request.ef_search or self.config.ef_search,
+            self.config.rerank if request.rerank is None else request.rerank,
+            request.include_content,
+            request.context_chars,
+            request.search_mode or self.config.search_mode,
+            request.search_filter,
+        )
+
+    def answer(self, settings: tuple[Any, ...], batch: list[PendingQuery]) -> None:
+        limit, nprobe, ef_search, rerank, include_content, context_chars, search_mode, search_filter = settings
+        try:
+            answers = self.engine.search_batch(
+                [request.query for request, _ in batch],
+                self.source_root,
+                self.client,
+                self.config.embed_model,
+                limit,
+                nprobe,
+                ef_search,
+                rerank,
+                self.config.disk_cache,
+                include_content,
+                context_chars,
+                search_mode=search_mode,
+                search_filter=search_filter,
+            )
+        except Exception as exc:
+            answers = [([], f"Search failed: {exc}") for _ in batch]
+        for (_, future), answer in zip(batch, answers):
+            future.set_result(answer)
+
+    def run(self) -> None:
+        while True:
+            groups: dict[tuple[Any, ...], list[PendingQuery]] = {}
+            for request, future in self.collect():
+                groups.setdefault(self.settings(request), []).append((request, future))
+            for settings, batch in groups.items():
+                self.answer(settings, batch)
+
+
+def build_ask_request_config(config: ServeConfig, request: AskRequest) -> AskConfig:
+    return AskConfig(
+        api_base=config.api_base,
+        api_key=config.api_key,
+        embed_model=config.embed_model,
+        ai_model=config.ai_model,
+        limit=request.limit or config.limit,
+        nprobe=request.nprobe or config.nprobe,
+        ef_search=request.ef_search or config.ef_search,
+        rerank=config.rerank if request.rerank is None else request.rerank,
+        disk_cache=config.disk_cache,
+        search_mode=request.search_mode or config.search_mode,
+        tool_max_retries=request.tool_max_retries or config.tool_max_retries,
+        context_tokens=request.context_tokens or config.context_tokens,
+        stream=False,
+        question=request.question,
+    )
+
+
+def build_request_handler(
+    batcher: QueryBatcher,
+    client: OpenAI,
+    config: ServeConfig,
+    source_root: Path,
+    index_root: Path
+) -> type[BaseHTTPRequestHandler]:
+    class QueryRequestHandler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, payload: dict[str, Any]) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self) -> Any:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self) -> None:
+            if self.path != "/health":
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            self.send_json(200, {"vectors": batcher.engine.ntotal()})
+
+        def do_POST(self) -> None:
+            try:
+                payload = self.read_json()
+                if self.path == "/query":
+                    results, error = batcher.submit(QueryRequest.model_validate(payload))
+                    self.send_json(200, {"results": results, "error": error})
+                elif self.path == "/ask":
+                    request = AskRequest.model_validate(payload)
+                    answer, error = run_assistant_loop(
+                        client=client,
+                        config=build_ask_request_config(config, request),
+                        source_root=source_root,
+                        index_root=index_root
+                    )
+                    self.send_json(200, {"answer": answer, "error": error})
+                else:
+                    self.send_json(404, {"error": f"Unknown path {self.path}"})
+            except (ValueError, ValidationError) as exc:
+                self.send_json(400, {"error": f"Invalid request: {exc}"})
+            except Exception as exc:
+                LOGGER.error(f"Failed to handle POST {self.path}: {exc}")
+                self.send_json(500, {"error": f"Internal error: {exc}"})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            LOGGER.debug(f"{self.address_string()} {format % args}")
+
+    return QueryRequestHandler
+
+
+def run_query_server(
+    source_root: Path,
+    index_root: Path,
+    config: ServeConfig,
+    client: OpenAI
+) -> None:
+    engine = get_search_engine(index_root)
+    LOGGER.info(f"Loaded index at {index_root} with {engine.ntotal()} vectors.")
+    batcher = QueryBatcher(engine, client, config, source_root)
+    batcher.start()
+    handler = build_request_handler(batcher, client, config, source_root, index_root)
+    server = QueryHTTPServer((config.host, config.port), handler)
+    LOGGER.info(f"Serving queries on http://{config.host}:{config.port} (POST /query, POST /ask, GET /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info("Shutting down query server.")
+    finally:
+        server.server_close()
@@ -1,6 +1,13 @@
-from pydantic import BaseModel, PositiveInt, NonNegativeFloat, ValidationError, ConfigDict
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    NonNegativeFloat,
+    NonNegativeInt,
+    PositiveInt,
+    ValidationError,
+)
 
-from config import get_logger
+from config import ChunkMode, IndexType, SearchMode, VectorStorage, get_logger
 
 LOGGER = get_logger()
 
@@ -10,18 +17,42 @@ class IndexConfig(BaseModel):
     file_batch_size: PositiveInt
     embed_batch_size: PositiveInt
     embed_batch_delay: NonNegativeFloat
+    embed_concurrency: PositiveInt
+    pipeline_depth: NonNegativeInt
+    read_workers: PositiveInt
     chunk_size: PositiveInt
+    chunk_mode: ChunkMode
+    max_file_size: PositiveInt
+    index_type: IndexType | None
+    storage: VectorStorage | None
+    nlist: NonNegativeInt | None
+    hnsw_m: PositiveInt | None
+    pq_m: PositiveInt | None
     api_base: str
     api_key: str
     model: str
 
 
+class SearchFilter(BaseModel):
+    """Restrict a search to chunks of matching files; empty fields match every file."""
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    path_prefix: str = ""
+    glob: str = ""
+    extensions: tuple[str, ...] = ()
+
+
 class QueryConfig(BaseModel):
     model_config = ConfigDict(extra="forbid")
     api_base: str
     api_key: str
     model: str
     limit: PositiveInt
+    nprobe: PositiveInt
+    ef_search: PositiveInt
+    rerank: NonNegativeInt
+    disk_cache: bool
+    search_mode: SearchMode
+    search_filter: SearchFilter
     query_str: str
 
 
@@ -32,15 +63,95 @@ class AskConfig(BaseModel):
     embed_model: str
     ai_model: str
     limit: PositiveInt
+    nprobe: PositiveInt
+    ef_search: PositiveInt
+    rerank: NonNegativeInt
+    disk_cache: bool
+    search_mode: SearchMode
     tool_max_retries: PositiveInt
+    context_tokens: PositiveInt
+    stream: bool
     question: str
 
 
+class BatchQueryConfig(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    api_base: str
+    api_key: str
+    model: str
+    limit: PositiveInt
+    nprobe: PositiveInt
+    ef_search: PositiveInt
+    rerank: NonNegativeInt
+    disk_cache: bool
+    search_mode: SearchMode
+    search_filter: SearchFilter
+    batch_size: PositiveInt
+    include_content: bool
+
+
+class ServeConfig(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    api_base: str
+    api_key: str
+    embed_model: str
+    ai_model: str
+    host: str
+    port: PositiveInt
+    limit: PositiveInt
+    nprobe: PositiveInt
+    ef_search: PositiveInt
+    rerank: NonNegativeInt
+    disk_cache: bool
+    search_mode: SearchMode
+    tool_max_retries: PositiveInt
+    context_tokens: PositiveInt
+    batch_window_ms: NonNegativeFloat
+    max_batch: PositiveInt
+
+
+class QueryRequest(BaseModel):
+    """Body of a `serve` /query request; unset search settings fall back to the server's."""
+    model_config = ConfigDict(extra="forbid")
+    query: str
+    limit: PositiveInt | None = None
+    nprobe: PositiveInt | None = None
+    ef_search: PositiveInt | None = None
+    rerank: NonNegativeInt | None = None
+    search_mode: SearchMode | None = None
+    search_filter: SearchFilter = SearchFilter()
+    include_content: bool = False
+    context_chars: NonNegativeInt = 160
+
+
+class AskRequest(BaseModel):
+    """Body of a `serve` /ask request; unset settings fall back to the server's."""
+    model_config = ConfigDict(extra="forbid")
+    question: str
+    limit: PositiveInt | None = None
+    nprobe: PositiveInt | None = None
+    ef_search: PositiveInt | None = None
+    rerank: NonNegativeInt | None = None
+    search_mode: SearchMode | None = None
+    tool_max_retries: PositiveInt | None = None
+    context_tokens: PositiveInt | None = None
+
+
 def build_index_config(
     file_batch_size: int,
     embed_batch_size: int,
     embed_batch_delay: float,
+    embed_concurrency: int,
+    pipeline_depth: int,
+    read_workers: int,
     chunk_size: int,
+    chunk_mode: ChunkMode,
+    max_file_size: int,
+    index_type: IndexType | None,
+    storage: VectorStorage | None,
+    nlist: int | None,
+    hnsw_m: int | None,
+    pq_m: int | None,
     api_base: str,
     api_key: str,
     model: str
@@ -50,7 +161,17 @@ def build_index_config(
             file_batch_size=file_batch_size,
             embed_batch_size=embed_batch_size,
             embed_batch_delay=embed_batch_delay,
+            embed_concurrency=embed_concurrency,
+            pipeline_depth=pipeline_depth,
+            read_workers=read_workers,
             chunk_size=chunk_size,
+            chunk_mode=chunk_mode,
+            max_file_size=max_file_size,
+            index_type=index_type,
+            storage=storage,
+            nlist=nlist,
+            hnsw_m=hnsw_m,
+            pq_m=pq_m,
             api_base=api_base,
             api_key=api_key,
             model=model,
@@ -65,6 +186,14 @@ def build_query_config(
     api_key: str,
     model: str,
     limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    path_prefix: str,
+    glob: str,
+    extensions: list[str],
     query_str: str
 ) -> QueryConfig | None:
     try:
@@ -73,6 +202,12 @@ def build_query_config(
             api_key=api_key,
             model=model,
             limit=limit,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            rerank=rerank,
+            disk_cache=disk_cache,
+            search_mode=search_mode,
+            search_filter=SearchFilter(path_prefix=path_prefix, glob=glob, extensions=tuple(extensions)),
             query_str=query_str,
         )
     except ValidationError as exc:
@@ -86,7 +221,14 @@ def build_ask_config(
     embed_model: str,
     ai_model: str,
     limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
     tool_max_retries: int,
+    context_tokens: int,
+    stream: bool,
     question: str
 ) -> AskConfig | None:
     try:
@@ -96,9 +238,94 @@ def build_ask_config(
             embed_model=embed_model,
             ai_model=ai_model,
             limit=limit,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            rerank=rerank,
+            disk_cache=disk_cache,
+            search_mode=search_mode,
             tool_max_retries=tool_max_retries,
+            context_tokens=context_tokens,
+            stream=stream,
             question=question,
         )
     except ValidationError as exc:
         LOGGER.error(f"Invalid ask options: {exc}")
         return None
+
+
+def build_batch_query_config(
+    api_base: str,
+    api_key: str,
+    model: str,
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    path_prefix: str,
+    glob: str,
+    extensions: list[str],
+    batch_size: int,
+    include_content: bool
+) -> BatchQueryConfig | None:
+    try:
+        return BatchQueryConfig(
+            api_base=api_base,
+            api_key=api_key,
+            model=model,
+            limit=limit,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            rerank=rerank,
+            disk_cache=disk_cache,
+            search_mode=search_mode,
+            search_filter=SearchFilter(path_prefix=path_prefix, glob=glob, extensions=tuple(extensions)),
+            batch_size=batch_size,
+            include_content=include_content,
+        )
+    except ValidationError as exc:
+        LOGGER.error(f"Invalid batch query options: {exc}")
+        return None
+
+
+def build_serve_config(
+    api_base: str,
+    api_key: str,
+    embed_model: str,
+    ai_model: str,
+    host: str,
+    port: int,
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    rerank: int,
+    disk_cache: bool,
+    search_mode: SearchMode,
+    tool_max_retries: int,
+    context_tokens: int,
+    batch_window_ms: float,
+    max_batch: int
+) -> ServeConfig | None:
+    try:
+        return ServeConfig(
+            api_base=api_base,
+            api_key=api_key,
+            embed_model=embed_model,
+            ai_model=ai_model,
+            host=host,
+            port=port,
+            limit=limit,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            rerank=rerank,
+            disk_cache=disk_cache,
+            search_mode=search_mode,
+            tool_max_retries=tool_max_retries,
+            context_tokens=context_tokens,
+            batch_window_ms=batch_window_ms,
+            max_batch=max_batch,
+        )
+    except ValidationError as exc:
+        LOGGER.error(f"Invalid serve options: {exc}")
+        return None
@@ -0,0 +1,189 @@
+from pathlib import Path
+from sqlite3 import Connection
+from threading import Lock, local
+from typing import Any
+
+from faiss import Index
+from openai import OpenAI
+
+from config import Constants, SearchMode
+from database import connect_read_only, ensure_db, get_generation, get_meta
+from index_ann import load_rerank_index, load_search_index
+from index_store import load_query_index
+from query_cache import ResultCache
+from schemas import SearchFilter
+from search_filters import is_unfiltered
+from searching import run_search_batch
+
+
+class SearchEngine:
+    """Serve queries for one index root, keeping the indexes and metadata open between queries.
+
+    The FAISS indexes are reloaded only when the committed generation or the
+    search index recorded on disk changes. Search hits and filter ids are
+    cached per engine, since generation numbers of different indexes are unrelated.
+    """
+
+    def __init__(self, index_root: Path) -> None:
+        self.index_root = index_root
+        ensure_db(index_root).close()
+        self.connections = local()
+        self.lock = Lock()
+        self.state: tuple[Any, ...] | None = None
+        self.faiss_index: Index | None = None
+        self.exact_index: Index | None = None
+        self.exact_loaded = False
+        self.store_index: Index | None = None
+        self.result_cache = ResultCache(Constants.QUERY_RESULT_CACHE_SIZE.value)
+        self.filter_cache = ResultCache(Constants.QUERY_FILTER_CACHE_SIZE.value)
+
+    def connection(self) -> Connection:
+        """Return this thread's read-only metadata connection."""
+        meta_db = getattr(self.connections, "meta_db", None)
+        if meta_db is None:
+            meta_db = connect_read_only(self.index_root)
+            self.connections.meta_db = meta_db
+        return meta_db
+
+    def read_state(self, meta_db: Connection) -> tuple[Any, ...]:
+        return (
+            get_generation(meta_db),
+            get_meta(meta_db, "search_index"),
+            get_meta(meta_db, "search_generation"),
+        )
+
+    def refresh(self) -> Index:
+        """Return the current search index, reloading it if the index on disk moved on."""
+        meta_db = self.connection()
+        with self.lock:
+            state = self.read_state(meta_db)
+            if self.faiss_index is None or state != self.state:
+                self.faiss_index = load_search_index(meta_db, self.index_root)
+                self.exact_index = None
+                self.exact_loaded = False
+                self.store_index = None
+                self.state = state
+            return self.faiss_index
+
+    def rerank_index(self, faiss_index: Index, rerank: int) -> Index | None:
+        if rerank <= 0:
+            return None
+        with self.lock:
+            if not self.exact_loaded:
+                self.exact_index = load_rerank_index(faiss_index, self.index_root, rerank)
+                self.exact_loaded = True
+            return self.exact_index
+
+    def store(self) -> Index:
+        """Return the float32 store that filtered searches scan exactly."""
+        with self.lock:
+            if self.store_index is None:
+                self.store_index = load_query_index(self.index_root)
+            return self.store_index
+
+    def ntotal(self) -> int:
+        return self.refresh().ntotal
+
+    def search(
+        self,
+        query_str: str,
+        source_root: Path,
+        client: OpenAI,
+        model: str,
+        limit: int,
+        nprobe: int = Constants.NPROBE.value,
+        ef_search: int = Constants.EF_SEARCH.value,
+        rerank: int = Constants.RERANK_FACTOR.value,
+        disk_cache: bool = True,
+        include_content: bool = False,
+        context_chars: int = 160,
+        include_metadata: bool = True,
+        search_mode: SearchMode = SearchMode.VECTOR,
+        search_filter: SearchFilter | None = None
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        return self.search_batch(
+            [query_str],
+            source_root,
+            client,
+            model,
+            limit,
+            nprobe,
+            ef_search,
+            rerank,
+            disk_cache,
+            include_content,
+            context_chars,
+            include_metadata,
+            search_mode,
+            search_filter
+        )[0]
+
+    def search_batch(
+        self,
+        query_strs: list[str],
+        source_root: Path,
+        client: OpenAI,
+        model: str,
+        limit: int,
+        nprobe: int = Constants.NPROBE.value,
+        ef_search: int = Constants.EF_SEARCH.value,
+        rerank: int = Constants.RERANK_FACTOR.value,
+        disk_cache: bool = True,
+        include_content: bool = False,
+        context_chars: int = 160,
+        include_metadata: bool = True,
+        search_mode: SearchMode = SearchMode.VECTOR,
+        search_filter: SearchFilter | None = None
+    ) -> list[tuple[list[dict[str, Any]], str | None]]:
+        """Answer queries that share search settings with one embedding request and one FAISS search.
+
+        Lexical queries never touch the FAISS indexes.
+        """
+        meta_db = self.connection()
+        if search_mode != SearchMode.VECTOR and not get_meta(meta_db, "lexical_index"):
+            return [([], "Full-text index is missing. Run 'index' command first.") for _ in query_strs]
+        faiss_index = exact_index = store_index = None
+        if search_mode != SearchMode.LEXICAL:
+            faiss_index = self.refresh()
+            if faiss_index.ntotal == 0:
+                return [([], "Index is empty. Run 'index' command first.") for _ in query_strs]
+            exact_index = self.rerank_index(faiss_index, rerank)
+            if not is_unfiltered(search_filter):
+                store_index = self.store()
+        return run_search_batch(
+            meta_db=meta_db,
+            faiss_index=faiss_index,
+            exact_index=exact_index,
+            source_root=source_root,
+            client=client,
+            model=model,
+            query_strs=query_strs,
+            limit=limit,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            rerank=rerank,
+            cache_root=self.index_root if disk_cache else None,
+            include_content=include_content,
+            context_chars=context_chars,
+            include_metadata=include_metadata,
+            search_mode=search_mode,
+            search_filter=search_filter,
+            store_index=store_index,
+            result_cache=self.result_cache,
+            filter_cache=self.filter_cache
+        )
+
+
+ENGINES: dict[Path, SearchEngine] = {}
+ENGINES_LOCK = Lock()
+
+
+def get_search_engine(index_root: Path) -> SearchEngine:
+    """Return the process-wide engine for `index_root`, opening it on first use."""
+    key = index_root.resolve()
+    with ENGINES_LOCK:
+        engine = ENGINES.get(key)
+        if engine is None:
+            engine = SearchEngine(index_root)
+            ENGINES[key] = engine
+        return engine
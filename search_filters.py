@@ -0,0 +1,52 @@
+from sqlite3 import Connection
+from typing import Any
+
+import numpy as np
+
+from database import get_generation
+from query_cache import ResultCache
+from schemas import SearchFilter
+
+
+def is_unfiltered(search_filter: SearchFilter | None) -> bool:
+    return search_filter is None or search_filter == SearchFilter()
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Return the smallest string greater than every string starting with `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def build_filter_conditions(search_filter: SearchFilter, column: str = "file_path") -> tuple[str, list[Any]]:
+    """Translate a filter into a WHERE fragment on `column` that SQLite can answer from idx_file_path.
+
+    The path prefix names a file or directory and becomes an equality test plus a range
+    scan over `prefix/`, so `src/api` never matches `src/api_v2/`. Globs use SQLite GLOB,
+    where `*` also matches `/`.
+    """
+    conditions: list[str] = []
+    params: list[Any] = []
+    prefix = search_filter.path_prefix.replace("\\", "/").removeprefix("./").rstrip("/")
+    if prefix:
+        conditions.append(f"({column} = ? OR ({column} >= ? AND {column} < ?))")
+        params.extend([prefix, f"{prefix}/", prefix_upper_bound(f"{prefix}/")])
+    if search_filter.glob:
+        conditions.append(f"{column} GLOB ?")
+        params.append(search_filter.glob.removeprefix("./"))
+    extensions = [ext if ext.startswith(".") else f".{ext}" for ext in search_filter.extensions if ext]
+    if extensions:
+        conditions.append("(" + " OR ".join(f"{column} GLOB ?" for _ in extensions) + ")")
+        params.extend(f"*{ext}" for ext in extensions)
+    return " AND ".join(conditions) or "1", params
+
+
+def resolve_filter_ids(meta_db: Connection, search_filter: SearchFilter, filter_cache: ResultCache) -> np.ndarray:
+    """Return the sorted ids of embedded chunks matching the filter, cached per generation of this index."""
+    generation = get_generation(meta_db)
+    ids = filter_cache.get_hits(generation, search_filter)
+    if ids is None:
+        where, params = build_filter_conditions(search_filter)
+        rows = meta_db.execute(f"SELECT id FROM chunks WHERE indexed = 1 AND {where} ORDER BY id", params)
+        ids = np.fromiter((row[0] for row in rows), dtype="int64")
+        filter_cache.put_hits(generation, search_filter, ids)
+    return ids
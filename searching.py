@@ -1,92 +1,186 @@
 from pathlib import Path
 from sqlite3 import Connection
 from typing import Any
+import re
 
 import numpy as np
 from openai import OpenAI
 
-from config import Constants
-from database import ensure_db
-from indexing import ensure_index, read_chunk_content, read_chunk_with_context
+from config import Constants, SearchMode
+from database import get_generation
+from index_ann import build_id_selector, build_search_parameters, rerank_candidates, search_id_subset
+from indexing import (
+    generate_embeddings_batch,
+    is_source_unchanged,
+    read_chunk_snippet,
+    read_source_text,
+    slice_chunk_context,
+)
+from schemas import SearchFilter
+from search_filters import build_filter_conditions, is_unfiltered, resolve_filter_ids
+from query_cache import (
+    ResultCache,
+    embedding_cache_key,
+    get_cached_embeddings,
+    put_cached_embeddings,
+    result_cache_key,
+)
 
 
-def make_query_embedding(
+def make_query_embeddings(
     client: OpenAI,
     model: str,
-    query_str: str
-) -> tuple[list[float] | None, str | None]:
-    prefixed_query = f"search_query: {query_str}"
+    query_strs: list[str],
+    cache_root: Path | None = None
+) -> tuple[list[np.ndarray] | None, str | None]:
+    """Embed queries in one request, reusing cached embeddings; `cache_root` also enables the on-disk store."""
+    prefixed_queries = [f"search_query: {query_str}" for query_str in query_strs]
+    cache_keys = [
+        embedding_cache_key(model, Constants.DIMENSIONS.value, prefixed_query)
+        for prefixed_query in prefixed_queries
+    ]
+    embeddings = get_cached_embeddings(cache_keys, cache_root)
+    missing = list(dict.fromkeys(
+        prefixed_queries[i] for i, embedding in enumerate(embeddings) if embedding is None
+    ))
+    if not missing:
+        return embeddings, None
     try:
-        response = client.embeddings.create(
-            input=[prefixed_query],
-            model=model,
-            dimensions=Constants.DIMENSIONS.value
-        )
-        return response.data[0].embedding, None
+        vectors = generate_embeddings_batch(client, missing, model)
     except Exception as exc:
         return None, f"Failed to generate query embedding: {exc}"
+    created = dict(zip(missing, vectors))
+    new_embeddings: dict[str, np.ndarray] = {}
+    for i, prefixed_query in enumerate(prefixed_queries):
+        if embeddings[i] is None:
+            embeddings[i] = created[prefixed_query]
+            new_embeddings[cache_keys[i]] = embeddings[i]
+    put_cached_embeddings(new_embeddings, cache_root)
+    return embeddings, None
+
+
+def vector_hits(distances: Any, indices: Any) -> list[tuple[int, dict[str, float]]]:
+    """Turn one FAISS result row into (chunk_id, scores) hits, dropping empty slots."""
+    return [
+        (int(idx), {'distance': float(distance), 'similarity': 1.0 / (1.0 + float(distance))})
+        for idx, distance in zip(indices[0], distances[0])
+        if int(idx) != -1
+    ]
+
+
+def build_match_expression(query_str: str) -> str | None:
+    """Quote each word of the query as an FTS5 phrase and OR them, so identifiers and operators are safe."""
+    words = re.findall(r"\w+", query_str)
+    return " OR ".join(f'"{word}"' for word in words) if words else None
+
+
+def run_lexical_search(
+    meta_db: Connection,
+    query_strs: list[str],
+    limit: int,
+    search_filter: SearchFilter | None = None
+) -> list[list[tuple[int, dict[str, float]]]]:
+    """Rank chunks by BM25 over the full-text index, restricted to files matching `search_filter`."""
+    where, params = build_filter_conditions(search_filter or SearchFilter(), "chunks.file_path")
+    ranked = []
+    cursor = meta_db.cursor()
+    for query_str in query_strs:
+        expression = build_match_expression(query_str)
+        if expression is None:
+            ranked.append([])
+            continue
+        cursor.execute(f"""
+            SELECT chunks_fts.rowid, -bm25(chunks_fts) FROM chunks_fts
+            JOIN chunks ON chunks.id = chunks_fts.rowid
+            WHERE chunks_fts MATCH ? AND {where}
+            ORDER BY rank
+            LIMIT ?
+        """, (expression, *params, limit))
+        ranked.append([(int(row[0]), {'score': float(row[1])}) for row in cursor.fetchall()])
+    return ranked
+
+
+def fuse_rankings(
+    rankings: list[list[tuple[int, dict[str, float]]]],
+    limit: int
+) -> list[tuple[int, dict[str, float]]]:
+    """Merge rankings with reciprocal rank fusion, scoring each chunk by the sum of 1 / (k + rank)."""
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (Constants.RRF_K.value + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [(chunk_id, {'score': score}) for chunk_id, score in fused]
 
 
 def fetch_search_results(
     meta_db: Connection,
     source_root: Path,
-    indices: Any,
-    distances: Any,
+    hits: list[tuple[int, dict[str, float]]],
     include_content: bool,
     context_chars: int,
     include_metadata: bool
 ) -> list[dict[str, Any]]:
-    cursor = meta_db.cursor()
+    """Hydrate hits with one row query, seeking to byte ranges or reading each file at most once."""
+    rows = fetch_chunk_rows(meta_db.cursor(), [chunk_id for chunk_id, _ in hits])
+    sources: dict[str, str | None] = {}
     results = []
-    for idx, distance in zip(indices[0], distances[0]):
-        if int(idx) == -1:
+    for chunk_id, scores in hits:
+        row = rows.get(chunk_id)
+        if not row:
             continue
-        row = fetch_chunk_row(cursor, int(idx))
-        if row:
-            results.append(
-                build_search_result(
-                    row,
-                    distance,
-                    source_root,
-                    include_content,
-                    context_chars,
-                    include_metadata
-                )
+        results.append(
+            build_search_result(
+                row,
+                scores,
+                source_root,
+                sources,
+                include_content,
+                context_chars,
+                include_metadata
             )
+        )
     return results
 
 
-def fetch_chunk_row(cursor, chunk_id: int) -> tuple[Any, Any, Any, Any] | None:
-    cursor.execute("""
-        SELECT file_path, chunk_index, start_char, end_char
-        FROM chunks
-        WHERE id = ?
-    """, (chunk_id,))
-    row = cursor.fetchone()
-    if not row:
-        return None
-    return row
+def fetch_chunk_rows(cursor, chunk_ids: list[int]) -> dict[int, tuple[Any, ...]]:
+    """Fetch each hit's char and byte offsets plus the file size and mtime they are valid for."""
+    rows: dict[int, tuple[Any, ...]] = {}
+    unique_ids = list(dict.fromkeys(chunk_ids))
+    for i in range(0, len(unique_ids), Constants.SQL_BATCH_SIZE.value):
+        id_batch = unique_ids[i:i + Constants.SQL_BATCH_SIZE.value]
+        placeholders = ",".join("?" for _ in id_batch)
+        cursor.execute(f"""
+            SELECT id, file_path, chunk_index, start_char, end_char,
+                   start_byte, end_byte, file_size, modified_time
+            FROM chunks
+            WHERE id IN ({placeholders})
+        """, id_batch)
+        for row in cursor.fetchall():
+            rows[int(row[0])] = row[1:]
+    return rows
 
 
 def build_search_result(
-    row: tuple[Any, Any, Any, Any],
-    distance: Any,
+    row: tuple[Any, ...],
+    scores: dict[str, float],
     source_root: Path,
+    sources: dict[str, str | None],
     include_content: bool,
     context_chars: int,
     include_metadata: bool
 ) -> dict[str, Any]:
-    result = build_result_base(row, distance, include_metadata)
+    result = build_result_base(row, scores, include_metadata)
     if include_content:
-        content, context = read_match_content(source_root, row, context_chars)
+        content, context = read_match_content(source_root, row, context_chars, sources)
         result["content"] = content
         result["context"] = context
     return result
 
 
 def build_result_base(
-    row: tuple[Any, Any, Any, Any],
-    distance: Any,
+    row: tuple[Any, ...],
+    scores: dict[str, float],
     include_metadata: bool
 ) -> dict[str, Any]:
     result: dict[str, Any] = {'file_path': row[0]}
@@ -95,34 +189,114 @@ def build_result_base(
             'chunk_index': row[1],
             'start_char': row[2],
             'end_char': row[3],
-            'distance': float(distance),
-            'similarity': 1.0 / (1.0 + float(distance))
+            **scores
         })
     return result
 
 
 def read_match_content(
     source_root: Path,
-    row: tuple[Any, Any, Any, Any],
-    context_chars: int
+    row: tuple[Any, ...],
+    context_chars: int,
+    sources: dict[str, str | None]
 ) -> tuple[str, str]:
-    content = read_chunk_content(source_root / row[0], row[2], row[3])
-    context = read_chunk_with_context(
-        source_root / row[0],
-        row[2],
-        row[3],
-        context_chars
-    )
-    return content, context
+    """Seek to the chunk's bytes while the file is unchanged since indexing, else slice a full read."""
+    file_path = source_root / row[0]
+    if row[4] is not None and is_source_unchanged(file_path, row[6], row[7]):
+        return read_chunk_snippet(file_path, row[4], row[5], context_chars)
+    if row[0] not in sources:
+        sources[row[0]] = read_source_text(file_path)
+    source = sources[row[0]]
+    if source is None:
+        return "", ""
+    return source[row[2]:row[3]], slice_chunk_context(source, row[2], row[3], context_chars)
 
 
 def run_faiss_search(
     faiss_index: Any,
-    query_vector: list[float],
-    limit: int
+    query_vectors: list[np.ndarray],
+    limit: int,
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    exact_index: Any = None,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    filter_ids: np.ndarray | None = None,
+    store_index: Any = None
 ) -> tuple[Any, Any]:
-    query_array = np.array([query_vector], dtype='float32')
-    return faiss_index.search(query_array, limit)
+    """Search all query vectors in one FAISS call, returning (distances, indices) with a row per query.
+
+    With `filter_ids`, only those vectors are searched: a small set is scanned
+    exactly from `store_index`, a larger one is passed to FAISS as an ID selector.
+    """
+    query_array = np.array(query_vectors, dtype='float32')
+    if filter_ids is not None and store_index is not None and len(filter_ids) <= Constants.FILTER_EXACT_MAX_IDS.value:
+        try:
+            return search_id_subset(store_index, query_array, filter_ids, limit)
+        except RuntimeError:
+            pass  # ids committed after the store was loaded; fall back to the selector
+    selector = build_id_selector(filter_ids) if filter_ids is not None else None
+    params = build_search_parameters(faiss_index, nprobe, ef_search, selector)
+    if exact_index is None:
+        return faiss_index.search(query_array, limit, params=params)
+    _, indices = faiss_index.search(query_array, limit * rerank, params=params)
+    reranked = [
+        rerank_candidates(exact_index, query_array[row:row + 1], indices[row:row + 1], limit)
+        for row in range(len(query_array))
+    ]
+    return np.vstack([hits[0] for hits in reranked]), np.vstack([hits[1] for hits in reranked])
+
+
+def run_cached_faiss_search(
+    meta_db: Connection,
+    faiss_index: Any,
+    query_vectors: list[np.ndarray],
+    limit: int,
+    nprobe: int,
+    ef_search: int,
+    exact_index: Any,
+    rerank: int,
+    result_cache: ResultCache,
+    search_filter: SearchFilter | None = None,
+    filter_ids: np.ndarray | None = None,
+    store_index: Any = None
+) -> list[tuple[Any, Any]]:
+    """Reuse the hits of identical searches made against the same index generation.
+
+    `result_cache` must belong to this index alone; generations of different indexes are unrelated.
+
+    Queries without cached hits are searched together; each query gets one-row (distances, indices).
+    """
+    generation = get_generation(meta_db)
+    cache_keys = [
+        result_cache_key(
+            query_vector,
+            type(faiss_index).__name__,
+            limit,
+            nprobe,
+            ef_search,
+            rerank if exact_index is not None else 0,
+            search_filter
+        )
+        for query_vector in query_vectors
+    ]
+    hits = [result_cache.get_hits(generation, cache_key) for cache_key in cache_keys]
+    missing = [i for i, found in enumerate(hits) if found is None]
+    if missing:
+        distances, indices = run_faiss_search(
+            faiss_index,
+            [query_vectors[i] for i in missing],
+            limit,
+            nprobe,
+            ef_search,
+            exact_index,
+            rerank,
+            filter_ids,
+            store_index
+        )
+        for row, i in enumerate(missing):
+            hits[i] = (distances[row:row + 1], indices[row:row + 1])
+            result_cache.put_hits(generation, cache_keys[i], hits[i])
+    return hits
 
 
 def search_index(
@@ -132,54 +306,114 @@ def search_index(
     client: OpenAI,
     model: str,
     limit: int,
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    disk_cache: bool = True,
     include_content: bool = False,
     context_chars: int = 160,
-    include_metadata: bool = True
+    include_metadata: bool = True,
+    search_mode: SearchMode = SearchMode.VECTOR,
+    search_filter: SearchFilter | None = None
 ) -> tuple[list[dict[str, Any]], str | None]:
-    faiss_index = ensure_index(index_root)
-    if faiss_index.ntotal == 0:
-        return [], "Index is empty. Run 'index' command first."
-    meta_db = ensure_db(index_root)
-    try:
-        return run_search(
-            meta_db=meta_db,
-            faiss_index=faiss_index,
-            source_root=source_root,
-            client=client,
-            model=model,
-            query_str=query_str,
-            limit=limit,
-            include_content=include_content,
-            context_chars=context_chars,
-            include_metadata=include_metadata
-        )
-    finally:
-        meta_db.close()
+    """Search through the process-wide engine, so repeated calls reuse the loaded index."""
+    from search_engine import get_search_engine
 
+    return get_search_engine(index_root).search(
+        query_str=query_str,
+        source_root=source_root,
+        client=client,
+        model=model,
+        limit=limit,
+        nprobe=nprobe,
+        ef_search=ef_search,
+        rerank=rerank,
+        disk_cache=disk_cache,
+        include_content=include_content,
+        context_chars=context_chars,
+        include_metadata=include_metadata,
+        search_mode=search_mode,
+        search_filter=search_filter
+    )
 
-def run_search(
+
+def run_search_batch(
     meta_db: Connection,
     faiss_index: Any,
     source_root: Path,
     client: OpenAI,
     model: str,
-    query_str: str,
+    query_strs: list[str],
     limit: int,
     include_content: bool,
     context_chars: int,
-    include_metadata: bool
-) -> tuple[list[dict[str, Any]], str | None]:
-    query_vector, error = make_query_embedding(client, model, query_str)
-    if error:
-        return [], error
-    distances, indices = run_faiss_search(faiss_index, query_vector, limit)
-    results = fetch_search_results(
-        meta_db=meta_db,
-        source_root=source_root,
-        indices=indices,
-        distances=distances,
-        include_content=include_content,
-        context_chars=context_chars,
-        include_metadata=include_metadata
-    )
-    return results, None
+    include_metadata: bool,
+    nprobe: int = Constants.NPROBE.value,
+    ef_search: int = Constants.EF_SEARCH.value,
+    exact_index: Any = None,
+    rerank: int = Constants.RERANK_FACTOR.value,
+    cache_root: Path | None = None,
+    search_mode: SearchMode = SearchMode.VECTOR,
+    search_filter: SearchFilter | None = None,
+    store_index: Any = None,
+    result_cache: ResultCache | None = None,
+    filter_cache: ResultCache | None = None
+) -> list[tuple[list[dict[str, Any]], str | None]]:
+    """Run queries that share search settings with at most one embedding request and one FAISS search.
+
+    Lexical mode skips both and ranks with BM25 alone; hybrid mode fuses the
+    BM25 and FAISS rankings, each fetched several times deeper than `limit`.
+    A filter is resolved to chunk ids first, so the top-k only ranks matching chunks.
+    Without caches owned by the caller's index, hits and filter ids are only shared within this call.
+    """
+    if result_cache is None:
+        result_cache = ResultCache(Constants.QUERY_RESULT_CACHE_SIZE.value)
+    if filter_cache is None:
+        filter_cache = ResultCache(Constants.QUERY_FILTER_CACHE_SIZE.value)
+    if is_unfiltered(search_filter):
+        search_filter = None
+    if search_mode == SearchMode.LEXICAL:
+        ranked = run_lexical_search(meta_db, query_strs, limit, search_filter)
+    else:
+        filter_ids = resolve_filter_ids(meta_db, search_filter, filter_cache) if search_filter else None
+        if filter_ids is not None and not len(filter_ids):
+            return [([], None) for _ in query_strs]
+        query_vectors, error = make_query_embeddings(client, model, query_strs, cache_root)
+        if error:
+            return [([], error) for _ in query_strs]
+        depth = limit if search_mode == SearchMode.VECTOR else limit * Constants.HYBRID_CANDIDATE_FACTOR.value
+        hits = run_cached_faiss_search(
+            meta_db,
+            faiss_index,
+            query_vectors,
+            depth,
+            nprobe,
+            ef_search,
+            exact_index,
+            rerank,
+            result_cache,
+            search_filter,
+            filter_ids,
+            store_index
+        )
+        ranked = [vector_hits(distances, indices) for distances, indices in hits]
+        if search_mode == SearchMode.HYBRID:
+            lexical = run_lexical_search(meta_db, query_strs, depth, search_filter)
+            ranked = [
+                fuse_rankings([vector_ranking, lexical_ranking], limit)
+                for vector_ranking, lexical_ranking in zip(ranked, lexical)
+            ]
+    return [
+        (
+            fetch_search_results(
+                meta_db=meta_db,
+                source_root=source_root,
+                hits=query_hits,
+                include_content=include_content,
+                context_chars=context_chars,
+                include_metadata=include_metadata
+            ),
+            None
+        )
+        for query_hits in ranked
+    ]
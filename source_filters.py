@@ -0,0 +1,57 @@
+from os import stat_result
+from pathlib import Path
+
+from config import GENERATED_MARKER, Constants, SkipReason
+
+TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+WHITESPACE_BYTES = b" \t\r\n"
+
+
+def is_binary_sample(sample: bytes) -> bool:
+    """Treat NUL bytes or a high share of control bytes as binary, like git and grep do."""
+    if b"\0" in sample:
+        return True
+    if not sample:
+        return False
+    control_bytes = len(sample.translate(None, TEXT_BYTES))
+    return control_bytes / len(sample) > Constants.BINARY_CONTROL_RATIO.value
+
+
+def is_generated_sample(sample: bytes) -> bool:
+    """Spot files marked as generated in their header, and minified files: long lines with almost no whitespace."""
+    lines = sample.split(b"\n")
+    if GENERATED_MARKER.search(b"\n".join(lines[:Constants.GENERATED_HEADER_LINES.value])):
+        return True
+    longest_line = max(len(line) for line in lines)
+    if longest_line < Constants.MINIFIED_LINE_LENGTH.value:
+        return False
+    whitespace = len(sample) - len(sample.translate(None, WHITESPACE_BYTES))
+    return whitespace / len(sample) < Constants.MINIFIED_WHITESPACE_RATIO.value
+
+
+def classify_sample(sample: bytes) -> SkipReason | None:
+    if is_binary_sample(sample):
+        return SkipReason.BINARY
+    if is_generated_sample(sample):
+        return SkipReason.GENERATED
+    return None
+
+
+def read_source_bytes(
+    path: Path,
+    max_file_size: int = Constants.MAX_FILE_SIZE.value
+) -> tuple[bytes | None, stat_result, SkipReason | None]:
+    """Read a file unless its size or first few KB show it is not worth indexing.
+
+    Oversized files are rejected from stat alone, and binary or generated files after
+    reading only the sample, so neither is read in full.
+    """
+    file_stat = path.stat()
+    if file_stat.st_size > max_file_size:
+        return None, file_stat, SkipReason.TOO_LARGE
+    with open(path, 'rb') as source:
+        sample = source.read(Constants.SNIFF_BYTES.value)
+        skip_reason = classify_sample(sample)
+        if skip_reason:
+            return None, file_stat, skip_reason
+        return sample + source.read(), file_stat, None
@@ -0,0 +1,80 @@
+import json
+
+from assistant_context import ConversationBudget
+
+
+def result(file_path: str, chunk_index: int, content: str = "x" * 400) -> dict:
+    return {
+        "file_path": file_path,
+        "chunk_index": chunk_index,
+        "start_char": 0,
+        "end_char": len(content),
+        "content": content,
+    }
+
+
+def tool_message(tool_call_id: str, *results: dict) -> dict:
+    return {
+        "role": "tool",
+        "tool_call_id": tool_call_id,
+        "content": json.dumps({"query": "q", "results": list(results)}),
+    }
+
+
+def assistant_turn(tool_call_id: str) -> dict:
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [{"id": tool_call_id, "function": {"name": "query", "arguments": "{}"}}],
+    }
+
+
+def payload(message: dict) -> dict:
+    return json.loads(message["content"])
+
+
+def test_repeated_chunks_become_references():
+    budget = ConversationBudget(max_tokens=100_000)
+    budget.record([tool_message("a", result("f.py", 0))])
+    [message] = budget.record([tool_message("b", result("f.py", 0), result("f.py", 1))])
+    content = payload(message)
+    assert [item["chunk_index"] for item in content["results"]] == [1]
+    assert content["already_seen"] == [{"file_path": "f.py", "chunk_index": 0, "start_char": 0, "end_char": 400}]
+
+
+def test_new_messages_are_left_untouched():
+    budget = ConversationBudget(max_tokens=100_000)
+    message = tool_message("a", result("f.py", 0))
+    original = message["content"]
+    budget.record([message])
+    assert message["content"] == original
+
+
+def test_compact_shortens_oldest_outputs_and_keeps_latest_turn():
+    budget = ConversationBudget(max_tokens=200)
+    first = tool_message("a", result("f.py", 0))
+    second = tool_message("b", result("g.py", 0))
+    messages = [assistant_turn("a"), *budget.record([first]), assistant_turn("b"), *budget.record([second])]
+    budget.compact(messages)
+    assert payload(first)["compacted"] is True
+    assert "content" not in payload(first)["results"][0]
+    assert "compacted" not in payload(second)
+    assert payload(second)["results"][0]["content"] == "x" * 400
+
+
+def test_compacted_chunks_can_be_shown_again():
+    budget = ConversationBudget(max_tokens=50)
+    first = tool_message("a", result("f.py", 0))
+    messages = [assistant_turn("a"), *budget.record([first]), assistant_turn("b")]
+    budget.compact(messages)
+    [again] = budget.record([tool_message("c", result("f.py", 0))])
+    assert payload(again)["results"][0]["content"] == "x" * 400
+    assert "already_seen" not in payload(again)
+
+
+def test_conversation_under_budget_is_not_compacted():
+    budget = ConversationBudget(max_tokens=100_000)
+    message = tool_message("a", result("f.py", 0))
+    messages = [assistant_turn("a"), *budget.record([message]), assistant_turn("b")]
+    budget.compact(messages)
+    assert "compacted" not in payload(message)
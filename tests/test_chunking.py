@@ -0,0 +1,45 @@
+from chunking import find_content_boundaries
+
+
+def numbered_lines(count: int) -> str:
+    return "".join(f"value_{i} = compute({i})\n" for i in range(count))
+
+
+def pieces(content: str, boundaries: list[int]) -> list[str]:
+    starts = [0, *boundaries[:-1]]
+    return [content[start:end] for start, end in zip(starts, boundaries)]
+
+
+def test_empty_content_has_no_boundaries():
+    assert find_content_boundaries("", 10, 20) == []
+
+
+def test_boundaries_cover_content_within_size_limits():
+    content = numbered_lines(2000)
+    boundaries = find_content_boundaries(content, 200, 400)
+    assert boundaries == sorted(set(boundaries))
+    assert boundaries[-1] == len(content)
+    chunks = pieces(content, boundaries)
+    assert "".join(chunks) == content
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert all(len(chunk) >= 200 for chunk in chunks[:-1])
+
+
+def test_boundaries_fall_on_line_ends():
+    content = numbered_lines(2000)
+    for boundary in find_content_boundaries(content, 200, 400):
+        assert content[boundary - 1] == "\n"
+
+
+def test_line_longer_than_max_size_is_cut():
+    content = "x" * 1000
+    assert find_content_boundaries(content, 100, 300) == [300, 600, 900, 1000]
+
+
+def test_edit_only_moves_nearby_boundaries():
+    content = numbered_lines(2000)
+    prefix = "import os\n"
+    before = find_content_boundaries(content, 200, 400)
+    after = find_content_boundaries(prefix + content, 200, 400)
+    shifted = {boundary + len(prefix) for boundary in before}
+    assert len(shifted & set(after)) >= len(before) - 2
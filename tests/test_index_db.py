@@ -0,0 +1,42 @@
+from index_db import assign_chunk_rows
+
+
+def chunk(chunk_index: int, content_hash: str) -> dict:
+    return {"chunk_index": chunk_index, "content_hash": content_hash}
+
+
+def test_unchanged_chunks_keep_their_rows():
+    existing = [(1, 0, "a", 1), (2, 1, "b", 1)]
+    assert assign_chunk_rows([chunk(0, "a"), chunk(1, "b")], existing) == existing
+
+
+def test_shifted_chunks_reuse_rows_by_hash():
+    existing = [(1, 0, "a", 1), (2, 1, "b", 1)]
+    assigned = assign_chunk_rows([chunk(0, "new"), chunk(1, "a"), chunk(2, "b")], existing)
+    assert assigned == [None, (1, 0, "a", 1), (2, 1, "b", 1)]
+
+
+def test_changed_chunk_takes_over_its_slot():
+    existing = [(1, 0, "a", 1), (2, 1, "b", 1)]
+    assigned = assign_chunk_rows([chunk(0, "a"), chunk(1, "changed")], existing)
+    assert assigned == [(1, 0, "a", 1), (2, 1, "b", 1)]
+
+
+def test_unindexed_rows_are_not_reused_by_hash():
+    existing = [(1, 0, "a", 0)]
+    assigned = assign_chunk_rows([chunk(0, "new"), chunk(1, "a")], existing)
+    assert assigned == [(1, 0, "a", 0), None]
+
+
+def test_duplicate_hashes_claim_distinct_rows():
+    existing = [(1, 0, "dup", 1), (2, 1, "dup", 1)]
+    assigned = assign_chunk_rows([chunk(0, "x"), chunk(1, "dup"), chunk(2, "dup")], existing)
+    assert assigned[0] is None
+    assert {assigned[1][0], assigned[2][0]} == {1, 2}
+
+
+def test_each_row_is_assigned_once():
+    existing = [(1, 0, "a", 1), (2, 1, "b", 1), (3, 2, "c", 1)]
+    chunks = [chunk(0, "c"), chunk(1, "a"), chunk(2, "z"), chunk(3, "b")]
+    rows = [row[0] for row in assign_chunk_rows(chunks, existing) if row is not None]
+    assert sorted(rows) == [1, 2, 3]
@@ -0,0 +1,103 @@
+import pytest
+
+import index_paths
+from index_paths import is_ignored, iter_source_files, parse_ignore_line
+from indexer import SourceScan
+
+
+def scope(base: str, *lines: str) -> tuple[str, list]:
+    return base, [rule for rule in map(parse_ignore_line, lines) if rule is not None]
+
+
+@pytest.mark.parametrize("line", ["", "   ", "# comment", "/", "\n"])
+def test_blank_lines_and_comments_have_no_rule(line):
+    assert parse_ignore_line(line) is None
+
+
+def test_rule_flags():
+    _, negated, directory_only = parse_ignore_line("!build/\n")
+    assert negated and directory_only
+    _, negated, directory_only = parse_ignore_line("*.log")
+    assert not negated and not directory_only
+
+
+def test_escaped_leading_characters_are_literal():
+    pattern, negated, _ = parse_ignore_line("\\!important")
+    assert not negated and pattern.match("!important")
+    pattern, _, _ = parse_ignore_line("\\#notes")
+    assert pattern.match("#notes")
+
+
+def test_trailing_escaped_space_is_kept():
+    pattern, _, _ = parse_ignore_line("name\\ ")
+    assert pattern.match("name ") and not pattern.match("name")
+
+
+@pytest.mark.parametrize("line, path, expected", [
+    ("*.log", "debug.log", True),
+    ("*.log", "logs/debug.log", True),
+    ("*.log", "debug.log.txt", False),
+    ("/build", "build", True),
+    ("/build", "src/build", False),
+    ("doc/*.txt", "doc/notes.txt", True),
+    ("doc/*.txt", "doc/api/notes.txt", False),
+    ("doc/**/*.txt", "doc/api/notes.txt", True),
+    ("**/cache", "a/b/cache", True),
+    ("file?.py", "file1.py", True),
+    ("file?.py", "file/.py", False),
+    ("[!a]*.py", "b.py", True),
+    ("[!a]*.py", "a.py", False),
+])
+def test_glob_patterns(line, path, expected):
+    assert is_ignored([scope("", line)], path, False) is expected
+
+
+def test_directory_only_rules_skip_files():
+    scopes = [scope("", "out/")]
+    assert is_ignored(scopes, "out", True)
+    assert not is_ignored(scopes, "out", False)
+
+
+def test_last_matching_rule_wins():
+    scopes = [scope("", "*.py", "!keep.py")]
+    assert is_ignored(scopes, "drop.py", False)
+    assert not is_ignored(scopes, "keep.py", False)
+
+
+def test_nested_scope_applies_relative_to_its_directory():
+    scopes = [scope("", "*.tmp"), scope("pkg/", "!cache.tmp", "/local")]
+    assert is_ignored(scopes, "pkg/other.tmp", False)
+    assert not is_ignored(scopes, "pkg/cache.tmp", False)
+    assert is_ignored(scopes, "pkg/local", False)
+    assert not is_ignored(scopes, "pkg/sub/local", False)
+
+
+@pytest.fixture
+def source_tree(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.py").write_text("a = 1\n")
+    (tmp_path / "b.py").write_text("b = 1\n")
+    (tmp_path / "skip.log").write_text("log\n")
+    (tmp_path / ".gitignore").write_text("*.log\n")
+    return tmp_path
+
+
+def test_walk_yields_relative_paths_and_honours_gitignore(source_tree):
+    relative_paths = {relative_path for _, relative_path, _ in iter_source_files(source_tree)}
+    assert relative_paths == {".gitignore", "b.py", "sub/a.py"}
+
+
+def test_unlisted_directory_keeps_its_files(source_tree, monkeypatch):
+    real_scandir = index_paths.scandir
+
+    def failing_scandir(directory):
+        if directory.endswith("sub"):
+            raise PermissionError(13, "Permission denied", directory)
+        return real_scandir(directory)
+
+    monkeypatch.setattr(index_paths, "scandir", failing_scandir)
+    states = {path: (1, 0.0, True) for path in ("b.py", "gone.py", "sub/a.py", "subway.py")}
+    scan = SourceScan(source_tree, states)
+    list(scan)
+    assert scan.unlisted == ["sub/"]
+    assert sorted(scan.deleted()) == ["gone.py", "subway.py"]
@@ -0,0 +1,54 @@
+from sqlite3 import connect
+
+import pytest
+
+from config import MIGRATION
+from searching import build_match_expression, run_lexical_search
+
+
+@pytest.fixture
+def meta_db():
+    connection = connect(":memory:")
+    connection.executescript(MIGRATION)
+    documents = {
+        "src/parser.py": "def parse_tokens(source): return tokenize(source)",
+        "src/render.py": "def render_page(page): return page.html",
+        "docs/usage.md": "Call parse_tokens before render_page.",
+    }
+    for chunk_id, (file_path, content) in enumerate(documents.items(), 1):
+        connection.execute(
+            "INSERT INTO chunks (id, file_path, chunk_index, file_size, modified_time, start_char, end_char, indexed)"
+            " VALUES (?, ?, 0, ?, 0, 0, ?, 1)",
+            (chunk_id, file_path, len(content), len(content))
+        )
+        connection.execute("INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)", (chunk_id, content))
+    yield connection
+    connection.close()
+
+
+def test_words_are_quoted_and_ored():
+    assert build_match_expression("parse tokens") == '"parse" OR "tokens"'
+
+
+def test_operators_and_punctuation_are_dropped():
+    assert build_match_expression('a.b("x") AND NOT -c*') == '"a" OR "b" OR "x" OR "AND" OR "NOT" OR "c"'
+
+
+def test_query_without_words_has_no_expression():
+    assert build_match_expression("-- () */") is None
+
+
+@pytest.mark.parametrize("query", ['"unbalanced', "NEAR(a b)", "col:value", "a OR", "^start", "x AND (y"])
+def test_fts_syntax_in_queries_is_safe(meta_db, query):
+    [hits] = run_lexical_search(meta_db, [query], 10)
+    assert isinstance(hits, list)
+
+
+def test_lexical_search_ranks_matching_chunks(meta_db):
+    [hits] = run_lexical_search(meta_db, ["parse_tokens"], 10)
+    assert {chunk_id for chunk_id, _ in hits} == {1, 3}
+    assert all(scores["score"] > 0 for _, scores in hits)
+
+
+def test_query_without_words_returns_no_hits(meta_db):
+    assert run_lexical_search(meta_db, ["()"], 10) == [[]]
@@ -0,0 +1,71 @@
+from sqlite3 import connect
+
+import pytest
+
+from schemas import SearchFilter
+from search_filters import build_filter_conditions, is_unfiltered
+
+PATHS = [
+    "README.md",
+    "src/api",
+    "src/api/routes.py",
+    "src/api/views/list.ts",
+    "src/api_v2/routes.py",
+    "src/apiary.py",
+    "tests/test_api.py",
+]
+
+
+@pytest.fixture
+def meta_db():
+    connection = connect(":memory:")
+    connection.execute("CREATE TABLE files (file_path TEXT NOT NULL)")
+    connection.executemany("INSERT INTO files VALUES (?)", [(path,) for path in PATHS])
+    yield connection
+    connection.close()
+
+
+def matching(meta_db, **fields) -> list[str]:
+    where, params = build_filter_conditions(SearchFilter(**fields))
+    rows = meta_db.execute(f"SELECT file_path FROM files WHERE {where} ORDER BY file_path", params)
+    return [row[0] for row in rows]
+
+
+def test_empty_filter_matches_everything(meta_db):
+    assert build_filter_conditions(SearchFilter()) == ("1", [])
+    assert matching(meta_db) == sorted(PATHS)
+
+
+@pytest.mark.parametrize("prefix", ["src/api", "src/api/", "./src/api", "src\\api"])
+def test_path_prefix_stops_at_directory_boundary(meta_db, prefix):
+    assert matching(meta_db, path_prefix=prefix) == ["src/api", "src/api/routes.py", "src/api/views/list.ts"]
+
+
+def test_path_prefix_names_a_single_file(meta_db):
+    assert matching(meta_db, path_prefix="src/apiary.py") == ["src/apiary.py"]
+
+
+def test_glob_star_crosses_directories(meta_db):
+    assert matching(meta_db, glob="src/*.py") == ["src/api/routes.py", "src/api_v2/routes.py", "src/apiary.py"]
+
+
+@pytest.mark.parametrize("extensions", [("py",), (".py",), ("py", "")])
+def test_extensions_with_or_without_dot(meta_db, extensions):
+    assert matching(meta_db, extensions=extensions) == [
+        "src/api/routes.py", "src/api_v2/routes.py", "src/apiary.py", "tests/test_api.py"
+    ]
+
+
+def test_conditions_combine(meta_db):
+    assert matching(meta_db, path_prefix="src", extensions=("ts", "md")) == ["src/api/views/list.ts"]
+
+
+def test_column_name_is_used():
+    where, _ = build_filter_conditions(SearchFilter(glob="*.py"), "chunks.file_path")
+    assert where == "chunks.file_path GLOB ?"
+
+
+def test_is_unfiltered():
+    assert is_unfiltered(None)
+    assert is_unfiltered(SearchFilter())
+    assert not is_unfiltered(SearchFilter(extensions=("py",)))